@@ -0,0 +1,28 @@
+"""user version
+
+Revision ID: 3c5e7a9d1f20
+Revises: ffee5f481de9
+Create Date: 2026-10-19 10:02:41.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c5e7a9d1f20'
+down_revision: Union[str, Sequence[str], None] = 'ffee5f481de9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'version')
@@ -0,0 +1,28 @@
+"""username lower index
+
+Revision ID: 5d9b3f8e6a12
+Revises: c71f0b5e2d94
+Create Date: 2026-10-19 16:05:33.271940
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d9b3f8e6a12'
+down_revision: Union[str, Sequence[str], None] = 'c71f0b5e2d94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_users_username_lower', 'users', [sa.text('lower(username)')], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_username_lower', table_name='users')
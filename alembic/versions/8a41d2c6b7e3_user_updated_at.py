@@ -0,0 +1,30 @@
+"""user updated_at
+
+Revision ID: 8a41d2c6b7e3
+Revises: 3c5e7a9d1f20
+Create Date: 2026-10-19 11:24:05.530917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a41d2c6b7e3'
+down_revision: Union[str, Sequence[str], None] = '3c5e7a9d1f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+    op.create_index(op.f('ix_users_updated_at'), 'users', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_users_updated_at'), table_name='users')
+    op.drop_column('users', 'updated_at')
@@ -0,0 +1,66 @@
+"""checkins history
+
+Revision ID: c71f0b5e2d94
+Revises: 8a41d2c6b7e3
+Create Date: 2026-10-19 13:40:12.602318
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c71f0b5e2d94'
+down_revision: Union[str, Sequence[str], None] = '8a41d2c6b7e3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# monthly partitions created up front; later ones come from
+# CheckinRepository.ensure_partitions (run by the rollup job)
+PARTITION_MONTHS = 12
+
+
+def _month(offset: int) -> date:
+    today = date.today()
+    month_index = today.year * 12 + today.month - 1 + offset
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('checkins',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.DATE(), nullable=False),
+    sa.Column('xp', sa.Integer(), nullable=False),
+    sa.Column('streak', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'day'),
+    postgresql_partition_by='RANGE (day)'
+    )
+    op.create_index('ix_checkins_day', 'checkins', ['day'], unique=False)
+    op.execute("CREATE TABLE checkins_default PARTITION OF checkins DEFAULT")
+    for offset in range(PARTITION_MONTHS):
+        lower, upper = _month(offset), _month(offset + 1)
+        op.execute(
+            f"CREATE TABLE checkins_y{lower.year}m{lower.month:02d} PARTITION OF checkins "
+            f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+
+    op.create_table('checkin_daily_stats',
+    sa.Column('day', sa.DATE(), nullable=False),
+    sa.Column('checkins', sa.Integer(), nullable=False),
+    sa.Column('refreshed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('day')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('checkin_daily_stats')
+    # dropping the parent drops every partition with it
+    op.drop_index('ix_checkins_day', table_name='checkins')
+    op.drop_table('checkins')
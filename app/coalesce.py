@@ -0,0 +1,37 @@
+"""
+In-process request coalescing ("single flight").
+
+Concurrent callers asking for the same key share one backend call: the first
+starts it, the others await the same task. Set COALESCE_ENABLED=false to
+turn it off.
+"""
+import asyncio
+import os
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+from app import metrics
+
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "true").lower() == "true"
+
+T = TypeVar("T")
+
+
+class RequestCoalescer:
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        if not COALESCE_ENABLED:
+            return await fn()
+
+        task = self._inflight.get(key)
+        if task is None:
+            metrics.incr(f"coalesce.{self.name}.calls")
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            metrics.incr(f"coalesce.{self.name}.joined")
+        # shield: one caller disconnecting must not cancel the shared call
+        return await asyncio.shield(task)
@@ -1,21 +1,74 @@
 import os
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from uuid import uuid4
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
 DATABASE_URL = os.getenv(
     "DATABASE_URL",
     "postgresql+asyncpg://nima:secret123@db:5432/mydb"
 )
+SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() == "true"
+# SQLAlchemy's per-engine cache of compiled statements
+DB_QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", "500"))
+# asyncpg prepared statements: "prepared" keeps up to
+# DB_PREPARED_STATEMENT_CACHE_SIZE per connection; "pgbouncer" is for
+# transaction pooling, where a statement prepared on one server connection
+# may be run on another: no per-connection cache, unique statement names.
+DB_STATEMENT_CACHE_MODE = os.getenv("DB_STATEMENT_CACHE_MODE", "prepared")
+DB_PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", "256"))
 
+# Built on first use (normally in the app lifespan), not at import time,
+# so importing the app stays cheap and each worker gets its own pool.
+_engine: AsyncEngine | None = None
+_sessionmaker: sessionmaker | None = None
 
-engine = create_async_engine(DATABASE_URL, echo=True, future=True)
 
-AsyncSessionLocal = sessionmaker(
-    bind=engine,
-    class_=AsyncSession,
-    autoflush=False,
-    expire_on_commit=False
-)
+def connect_args(url: str = DATABASE_URL, mode: str = DB_STATEMENT_CACHE_MODE) -> dict:
+    if "+asyncpg" not in url:
+        return {}
+    if mode == "pgbouncer":
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    if mode != "prepared":
+        raise ValueError(f"Unknown DB_STATEMENT_CACHE_MODE: {mode!r}")
+    return {"prepared_statement_cache_size": DB_PREPARED_STATEMENT_CACHE_SIZE}
+
+
+def get_engine() -> AsyncEngine:
+    global _engine
+    if _engine is None:
+        _engine = create_async_engine(
+            DATABASE_URL,
+            echo=SQL_ECHO,
+            future=True,
+            query_cache_size=DB_QUERY_CACHE_SIZE,
+            connect_args=connect_args(),
+        )
+    return _engine
+
+
+def get_sessionmaker() -> sessionmaker:
+    global _sessionmaker
+    if _sessionmaker is None:
+        _sessionmaker = sessionmaker(
+            bind=get_engine(),
+            class_=AsyncSession,
+            autoflush=False,
+            expire_on_commit=False
+        )
+    return _sessionmaker
+
+
+async def dispose_engine():
+    global _engine, _sessionmaker
+    if _engine is not None:
+        await _engine.dispose()
+    _engine = None
+    _sessionmaker = None
 
 
 class Base(DeclarativeBase):
@@ -23,5 +76,13 @@ class Base(DeclarativeBase):
 
 
 async def get_db():
-    async with AsyncSessionLocal() as session:
+    async with get_sessionmaker()() as session:
         yield session
+
+
+def get_session_factory() -> sessionmaker:
+    """
+    Dependency for work that outlives the request (background tasks),
+    which must open its own sessions instead of borrowing the request's.
+    """
+    return get_sessionmaker()
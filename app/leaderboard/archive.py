@@ -0,0 +1,178 @@
+"""
+Leaderboard archives as compact columnar files.
+
+A snapshot file is a 24-byte header followed by four little-endian int64
+columns of `count` entries each:
+
+    xp         ascending, in ZRANGE order (rank = count - index)
+    user_id    the member at the same index
+    sorted_id  user ids, ascending
+    position   index of sorted_id[i] in the xp/user_id columns
+
+so "rank of user X" is a binary search over `sorted_id` and "rank of score
+S" a binary search over `xp`. Opened with `use_mmap=True` the columns are
+memoryviews over the mapped file and nothing is read up front.
+
+Files are named `leaderboard-YYYY-MM-DD.lbs` under LEADERBOARD_ARCHIVE_DIR;
+the snapshot in effect on a date is the latest one taken on or before it.
+
+Run with: python -m app.leaderboard.archive export|import [--day YYYY-MM-DD]
+"""
+import argparse
+import asyncio
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+ARCHIVE_MAGIC = b"LBSNAP01"
+LEADERBOARD_ARCHIVE_DIR = os.getenv("LEADERBOARD_ARCHIVE_DIR", "archives")
+LEADERBOARD_ARCHIVE_PAGE_SIZE = int(os.getenv("LEADERBOARD_ARCHIVE_PAGE_SIZE", "10000"))
+
+_HEADER = struct.Struct("<8sdQ")  # magic, taken_at, count
+_PREFIX = "leaderboard-"
+_SUFFIX = ".lbs"
+_NATIVE = sys.byteorder == "little"
+
+
+def archive_path(day: date, directory: str | None = None) -> str:
+    return os.path.join(directory or LEADERBOARD_ARCHIVE_DIR, f"{_PREFIX}{day.isoformat()}{_SUFFIX}")
+
+
+def archived_days(directory: str | None = None) -> list[date]:
+    directory = directory or LEADERBOARD_ARCHIVE_DIR
+    if not os.path.isdir(directory):
+        return []
+    days = []
+    for name in os.listdir(directory):
+        if name.startswith(_PREFIX) and name.endswith(_SUFFIX):
+            try:
+                days.append(date.fromisoformat(name[len(_PREFIX):-len(_SUFFIX)]))
+            except ValueError:
+                continue
+    return sorted(days)
+
+
+def archive_for(day: date, directory: str | None = None) -> str | None:
+    """Path of the latest snapshot taken on or before `day`."""
+    days = archived_days(directory)
+    index = bisect_right(days, day)
+    return archive_path(days[index - 1], directory) if index else None
+
+
+def write_archive(path: str, xp: array, user_ids: array, taken_at: float | None = None):
+    """Write columns given in ascending xp order; the file appears atomically."""
+    count = len(xp)
+    order = sorted(range(count), key=user_ids.__getitem__)
+    columns = [
+        xp,
+        user_ids,
+        array("q", (user_ids[i] for i in order)),
+        array("q", order),
+    ]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(ARCHIVE_MAGIC, taken_at or time.time(), count))
+        for column in columns:
+            if not _NATIVE:
+                column = array("q", column)
+                column.byteswap()
+            f.write(column.tobytes())
+    os.replace(tmp, path)
+
+
+class LeaderboardArchive:
+    """A read-only snapshot file; use as a context manager or call close()."""
+
+    def __init__(self, path: str, use_mmap: bool = True):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = None
+        try:
+            header = self._file.read(_HEADER.size)
+            magic, self.taken_at, self.count = _HEADER.unpack(header)
+            if magic != ARCHIVE_MAGIC:
+                raise ValueError(f"{path} is not a leaderboard archive")
+            if use_mmap and _NATIVE and self.count:
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                body = memoryview(self._mmap)[_HEADER.size:].cast("q")
+                self._columns = [body[i * self.count:(i + 1) * self.count] for i in range(4)]
+                body.release()
+            else:
+                self._columns = []
+                for _ in range(4):
+                    column = array("q")
+                    column.frombytes(self._file.read(self.count * column.itemsize))
+                    if not _NATIVE:
+                        column.byteswap()
+                    self._columns.append(column)
+        except BaseException:
+            self.close()
+            raise
+        self.xp, self.user_ids, self._sorted_ids, self._positions = self._columns
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __enter__(self) -> "LeaderboardArchive":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for column in getattr(self, "_columns", []):
+            if isinstance(column, memoryview):
+                column.release()
+        self._columns = []
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def lookup(self, user_id: int) -> tuple[int, int] | None:
+        """(rank, xp) of a user, ranks starting at 1 for the highest xp."""
+        i = bisect_left(self._sorted_ids, user_id)
+        if i == self.count or self._sorted_ids[i] != user_id:
+            return None
+        position = self._positions[i]
+        return self.count - position, self.xp[position]
+
+    def rank_for_xp(self, xp: int) -> int:
+        """Rank a score would have had: 1 + users with more xp."""
+        return 1 + self.count - bisect_right(self.xp, xp)
+
+    def top(self, limit: int) -> list[tuple[int, int]]:
+        """(user_id, xp) pairs, highest xp first."""
+        start = max(self.count - limit, 0)
+        return [(self.user_ids[i], self.xp[i]) for i in range(self.count - 1, start - 1, -1)]
+
+
+async def main():
+    from app.leaderboard.services import LeaderboardService
+    from app.redis_client import close_redis
+
+    parser = argparse.ArgumentParser(description="Export or import leaderboard archives")
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("--day", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--key", help="sorted set to import into")
+    args = parser.parse_args()
+
+    service = LeaderboardService()
+    try:
+        if args.command == "export":
+            result = await service.export_snapshot(args.day)
+        else:
+            result = await service.import_snapshot(archive_path(args.day), args.key)
+        print(f"✅ {args.command.capitalize()}ed leaderboard archive: {result}")
+    finally:
+        await close_redis()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,193 @@
+"""
+Leaderboard projection.
+
+Projects `leaderboard_events` into `leaderboard:global`. Each window of up to
+CONSUMER_BATCH_SIZE entries is compacted to the newest event per user and
+applied by a Lua script that, atomically:
+- skips events whose `version` is not newer than the one already projected
+  for that user (stored in `leaderboard:versions`),
+- writes the accepted scores and removes members whose accepted event is a
+  `deleted` tombstone (their version is kept, so nothing older comes back),
+- stores the last stream ID of the window as the checkpoint,
+- announces the change on `leaderboard:updates` (for the live feed).
+
+Because applying is idempotent, a replay from any stream ID can run against
+the live key while it keeps serving reads.
+
+Run with:
+    python -m app.leaderboard.consumer                  # follow from checkpoint
+    python -m app.leaderboard.consumer --replay-from 0  # replay, then exit
+"""
+import argparse
+import asyncio
+import os
+
+import redis.asyncio as redis
+
+from app.leaderboard.services import REDIS_URL, LEADERBOARD_KEY
+from app.users.events import LEADERBOARD_STREAM, LEADERBOARD_UPDATES_CHANNEL, LEADERBOARD_VERSIONS_KEY
+
+LEADERBOARD_CHECKPOINT_KEY = "leaderboard:checkpoint"
+
+CONSUMER_BATCH_SIZE = int(os.getenv("LEADERBOARD_CONSUMER_BATCH_SIZE", "500"))
+CONSUMER_BLOCK_MS = int(os.getenv("LEADERBOARD_CONSUMER_BLOCK_MS", "1000"))
+CONSUMER_START_ID = os.getenv("LEADERBOARD_CONSUMER_START_ID", "0-0")
+
+# KEYS: leaderboard, versions, checkpoint ("" to skip), updates channel
+# ARGV: last stream id, "1" to also accept equal versions, then
+#       (member, xp, version) triples; version -1 = unversioned,
+#       xp "" = tombstone (remove the member, keep the version)
+APPLY_SCRIPT = """
+local applied = 0
+local accept_equal = ARGV[2] == '1'
+local function write(member, xp)
+    if xp == '' then
+        redis.call('ZREM', KEYS[1], member)
+    else
+        redis.call('ZADD', KEYS[1], xp, member)
+    end
+end
+for i = 3, #ARGV, 3 do
+    local member = ARGV[i]
+    local version = tonumber(ARGV[i + 2])
+    if version < 0 then
+        write(member, ARGV[i + 1])
+        applied = applied + 1
+    else
+        local current = tonumber(redis.call('HGET', KEYS[2], member) or '0')
+        if version > current or (accept_equal and version == current) then
+            write(member, ARGV[i + 1])
+            redis.call('HSET', KEYS[2], member, version)
+            applied = applied + 1
+        end
+    end
+end
+if KEYS[3] ~= '' then
+    redis.call('SET', KEYS[3], ARGV[1])
+end
+if applied > 0 then
+    redis.call('PUBLISH', KEYS[4], applied)
+end
+return applied
+"""
+
+
+def compact_events(entries: list[tuple[str, dict]]) -> dict[str, tuple[int | None, int]]:
+    """
+    Collapse stream entries to one (xp, version) per user.
+    Events carry absolute XP, so only the newest one per user_id matters:
+    the highest version wins, and stream order breaks ties. Events without
+    a version get -1 and are applied unconditionally. A `deleted` event
+    compacts to xp None (a tombstone).
+    """
+    latest: dict[str, tuple[int | None, int]] = {}
+    for _entry_id, fields in entries:
+        user_id = fields.get("user_id")
+        xp = fields.get("xp")
+        if user_id is None or xp is None:
+            continue
+        member = str(user_id)
+        version = int(fields.get("version", -1))
+        previous = latest.get(member)
+        if previous is None or version < 0 or version >= previous[1]:
+            latest[member] = (None if fields.get("event") == "deleted" else int(xp), version)
+    return latest
+
+
+class LeaderboardProjection:
+    def __init__(self, r: redis.Redis, checkpoint: bool = True):
+        self.r = r
+        self.checkpoint = checkpoint
+        self._apply = r.register_script(APPLY_SCRIPT)
+
+    async def load_checkpoint(self) -> str:
+        """Return the last applied stream ID, or CONSUMER_START_ID if none."""
+        stored = await self.r.get(LEADERBOARD_CHECKPOINT_KEY)
+        return stored or CONSUMER_START_ID
+
+    async def apply(
+        self,
+        last_id: str,
+        latest: dict[str, tuple[int | None, int]],
+        accept_equal: bool = False
+    ) -> int:
+        """
+        Apply one compacted window. Returns the number of members written.
+        `accept_equal` lets a same-version write through (used for repairs).
+        """
+        keys = [
+            LEADERBOARD_KEY,
+            LEADERBOARD_VERSIONS_KEY,
+            LEADERBOARD_CHECKPOINT_KEY if self.checkpoint else "",
+            LEADERBOARD_UPDATES_CHANNEL,
+        ]
+        args = [last_id, "1" if accept_equal else "0"]
+        for member, (xp, version) in latest.items():
+            args.extend((member, "" if xp is None else xp, version))
+        return int(await self._apply(keys=keys, args=args))
+
+    async def consume_once(self, last_id: str, block: int | None = CONSUMER_BLOCK_MS) -> tuple[str, int, int]:
+        """
+        Read and apply one window of events after `last_id`.
+        Returns (new_last_id, events_read, members_written).
+        """
+        response = await self.r.xread(
+            {LEADERBOARD_STREAM: last_id},
+            count=CONSUMER_BATCH_SIZE,
+            block=block,
+        )
+        if not response:
+            return last_id, 0, 0
+
+        _stream, entries = response[0]
+        new_last_id = entries[-1][0]
+        written = await self.apply(new_last_id, compact_events(entries))
+        return new_last_id, len(entries), written
+
+    async def replay(self, from_id: str = "0-0") -> tuple[int, int]:
+        """
+        Re-apply every event after `from_id` until the end of the stream.
+        Returns (events_read, members_written).
+        """
+        last_id, total_read, total_written = from_id, 0, 0
+        while True:
+            last_id, read, written = await self.consume_once(last_id, block=None)
+            if not read:
+                return total_read, total_written
+            total_read += read
+            total_written += written
+
+
+async def run_consumer():
+    r = redis.from_url(REDIS_URL, decode_responses=True)
+    projection = LeaderboardProjection(r)
+    last_id = await projection.load_checkpoint()
+    print(f"📡 Consuming {LEADERBOARD_STREAM} from {last_id}")
+    try:
+        while True:
+            last_id, read, written = await projection.consume_once(last_id)
+            if read:
+                print(f"✅ Applied {read} event(s) as {written} leaderboard write(s)")
+    finally:
+        await r.aclose()
+
+
+async def run_replay(from_id: str):
+    r = redis.from_url(REDIS_URL, decode_responses=True)
+    # a replay must not move the live consumer's checkpoint
+    projection = LeaderboardProjection(r, checkpoint=False)
+    try:
+        read, written = await projection.replay(from_id)
+        print(f"✅ Replayed {read} event(s) from {from_id}, {written} leaderboard write(s)")
+    finally:
+        await r.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--replay-from", metavar="STREAM_ID")
+    cli_args = parser.parse_args()
+    if cli_args.replay_from is not None:
+        asyncio.run(run_replay(cli_args.replay_from))
+    else:
+        asyncio.run(run_consumer())
@@ -0,0 +1,152 @@
+"""
+Live top-N leaderboard feed over Server-Sent Events.
+
+Each worker runs one LeaderboardFeed task. While someone is connected it
+listens on `leaderboard:updates`, which the projection publishes to after
+it has written `leaderboard:global` (so a read never races the projection
+of the events that triggered it). It waits LEADERBOARD_FEED_DEBOUNCE_MS for
+a burst to settle, re-reads the top LEADERBOARD_FEED_TOP_N once and
+broadcasts the diff to every client.
+The encoded message is built once and shared by all clients.
+
+A client first receives the feed's current top-N as a `snapshot`, then
+`diff` events relative to it. Every client has a queue of at most
+LEADERBOARD_FEED_QUEUE_SIZE messages; a client that falls that far behind
+is disconnected (and can reconnect for a fresh snapshot) instead of
+buffering without bound.
+"""
+import asyncio
+import json
+import os
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from app import metrics
+from app.users.events import LEADERBOARD_KEY, LEADERBOARD_UPDATES_CHANNEL
+
+LEADERBOARD_FEED_TOP_N = int(os.getenv("LEADERBOARD_FEED_TOP_N", "50"))
+LEADERBOARD_FEED_DEBOUNCE_MS = int(os.getenv("LEADERBOARD_FEED_DEBOUNCE_MS", "500"))
+LEADERBOARD_FEED_BLOCK_MS = int(os.getenv("LEADERBOARD_FEED_BLOCK_MS", "5000"))
+LEADERBOARD_FEED_QUEUE_SIZE = int(os.getenv("LEADERBOARD_FEED_QUEUE_SIZE", "16"))
+LEADERBOARD_FEED_KEEPALIVE_SECONDS = int(os.getenv("LEADERBOARD_FEED_KEEPALIVE_SECONDS", "15"))
+
+Top = dict[str, tuple[int, int]]  # member -> (rank, xp)
+
+
+def format_event(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+def diff_top(previous: Top, current: Top) -> dict | None:
+    """Entries whose rank or xp changed and members that left the top-N."""
+    changed = [
+        {"user": member, "rank": rank, "xp": xp}
+        for member, (rank, xp) in current.items()
+        if previous.get(member) != (rank, xp)
+    ]
+    removed = [member for member in previous if member not in current]
+    if not changed and not removed:
+        return None
+    return {"changed": sorted(changed, key=lambda entry: entry["rank"]), "removed": removed}
+
+
+class Subscriber:
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue[bytes | None] = asyncio.Queue(queue_size)
+
+    def close(self):
+        """Discard pending messages and wake the reader with the end marker."""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class LeaderboardFeed:
+    def __init__(self, top_n: int = LEADERBOARD_FEED_TOP_N, queue_size: int = LEADERBOARD_FEED_QUEUE_SIZE):
+        self.top_n = top_n
+        self.queue_size = queue_size
+        self.top: Top = {}
+        self.subscribers: set[Subscriber] = set()
+        self._has_subscribers = asyncio.Event()
+
+    def subscribe(self) -> tuple[Subscriber, bytes]:
+        """Register a client; returns it with the snapshot it must start from."""
+        subscriber = Subscriber(self.queue_size)
+        self.subscribers.add(subscriber)
+        self._has_subscribers.set()
+        snapshot = [
+            {"user": member, "rank": rank, "xp": xp}
+            for member, (rank, xp) in sorted(self.top.items(), key=lambda item: item[1][0])
+        ]
+        return subscriber, format_event("snapshot", {"top": snapshot})
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+        if not self.subscribers:
+            self._has_subscribers.clear()
+
+    def broadcast(self, message: bytes):
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                metrics.incr("leaderboard_feed.dropped")
+                self.unsubscribe(subscriber)
+                subscriber.close()
+
+    async def refresh(self, r: redis.Redis) -> dict | None:
+        """Re-read the top-N and broadcast what changed. Returns the diff."""
+        entries = await r.zrevrange(LEADERBOARD_KEY, 0, self.top_n - 1, withscores=True)
+        current = {member: (rank, int(score)) for rank, (member, score) in enumerate(entries, 1)}
+        diff = diff_top(self.top, current)
+        self.top = current
+        if diff:
+            self.broadcast(format_event("diff", diff))
+        return diff
+
+    async def run(self, r: redis.Redis):
+        """The worker's single listener; idle (unsubscribed) while nobody is connected."""
+        while True:
+            await self._has_subscribers.wait()
+            pubsub = r.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(LEADERBOARD_UPDATES_CHANNEL)
+                # catch up on changes made while idle, then follow notifications
+                await self.refresh(r)
+                while self.subscribers:
+                    if await pubsub.get_message(timeout=LEADERBOARD_FEED_BLOCK_MS / 1000) is None:
+                        continue
+                    await asyncio.sleep(LEADERBOARD_FEED_DEBOUNCE_MS / 1000)
+                    # notifications that arrived while debouncing are covered
+                    # by the read below, which happens after all of them
+                    while await pubsub.get_message(timeout=0) is not None:
+                        pass
+                    await self.refresh(r)
+            except RedisError:
+                metrics.incr("leaderboard_feed.errors")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    async def stream(self):
+        """SSE body for one client."""
+        subscriber, snapshot = self.subscribe()
+        try:
+            yield snapshot
+            while True:
+                try:
+                    message = await asyncio.wait_for(
+                        subscriber.queue.get(), LEADERBOARD_FEED_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            self.unsubscribe(subscriber)
+
+
+feed = LeaderboardFeed()
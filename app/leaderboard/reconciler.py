@@ -0,0 +1,93 @@
+"""
+Incremental leaderboard reconciliation.
+
+Scans only the users changed since the last run (by `users.updated_at`),
+compares their XP with `leaderboard:global` in ZMSCORE batches and rewrites
+the members that drifted. Repairs go through the projection script, so a
+newer version already projected is never overwritten with an older row.
+
+Run with: python -m app.leaderboard.reconciler
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+import redis.asyncio as redis
+
+from app.database import dispose_engine, get_sessionmaker
+from app.leaderboard.consumer import LeaderboardProjection
+from app.leaderboard.services import LEADERBOARD_KEY
+from app.redis_client import close_redis, get_redis
+from app.users.repositories import UserRepository
+
+RECONCILE_WATERMARK_KEY = "leaderboard:reconcile:watermark"
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "1000"))
+# Rows are stamped with their transaction's start time, so a row can commit
+# after the watermark has passed it. Rescan this much history on every run.
+RECONCILE_OVERLAP_SECONDS = int(os.getenv("RECONCILE_OVERLAP_SECONDS", "60"))
+
+
+class LeaderboardReconciler:
+    def __init__(self, repo: UserRepository, r: redis.Redis):
+        self.repo = repo
+        self.r = r
+        self.projection = LeaderboardProjection(r, checkpoint=False)
+
+    async def load_watermark(self) -> datetime | None:
+        stored = await self.r.get(RECONCILE_WATERMARK_KEY)
+        return datetime.fromisoformat(stored) if stored else None
+
+    async def reconcile(self, full: bool = False) -> dict:
+        """
+        Repair drift for users changed since the stored watermark
+        (or for every user when `full` is set).
+        Returns counts of scanned and repaired users.
+        """
+        watermark = None if full else await self.load_watermark()
+        since = watermark - timedelta(seconds=RECONCILE_OVERLAP_SECONDS) if watermark else None
+        after_id = 0
+        scanned = repaired = 0
+
+        while True:
+            rows = await self.repo.list_changed_since(since, after_id, RECONCILE_BATCH_SIZE)
+            if not rows:
+                break
+            scores = await self.r.zmscore(LEADERBOARD_KEY, [str(row.id) for row in rows])
+            drifted = {
+                str(row.id): (row.xp, row.version)
+                for row, score in zip(rows, scores)
+                if score is None or int(score) != row.xp
+            }
+            if drifted:
+                repaired += await self.projection.apply("", drifted, accept_equal=True)
+
+            scanned += len(rows)
+            since, after_id = rows[-1].updated_at, rows[-1].id
+            if watermark is None or since > watermark:
+                watermark = since
+
+        if watermark is not None:
+            await self.r.set(RECONCILE_WATERMARK_KEY, watermark.isoformat())
+        return {
+            "scanned": scanned,
+            "repaired": repaired,
+            "watermark": watermark.isoformat() if watermark else None,
+        }
+
+
+async def reconcile_leaderboard(repo: UserRepository, full: bool = False) -> dict:
+    return await LeaderboardReconciler(repo, get_redis()).reconcile(full)
+
+
+async def main():
+    try:
+        async with get_sessionmaker()() as session:
+            stats = await reconcile_leaderboard(UserRepository(session))
+        print(f"✅ Reconciled leaderboard: {stats}")
+    finally:
+        await close_redis()
+        await dispose_engine()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,19 +1,50 @@
+from datetime import date
+
 from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
 from app.leaderboard.services import LeaderboardService
+from app.coalesce import RequestCoalescer
+from app.leaderboard.live import feed
+from app.ratelimit import rate_limit
+
+router = APIRouter(
+    prefix="/leaderboard",
+    tags=["leaderboard"],
+    dependencies=[Depends(rate_limit("leaderboard", "120/60"))],
+)
 
-router = APIRouter(prefix="/leaderboard", tags=["leaderboard"])
+top_users_coalescer = RequestCoalescer("leaderboard_top")
 
-async def get_service():
-    service = LeaderboardService()
-    try:
-        yield service
-    finally:
-        await service.close()
+def get_service() -> LeaderboardService:
+    return LeaderboardService()
 
 @router.get("/")
-async def get_leaderboard(limit: int = 50, service: LeaderboardService = Depends(get_service)):
-    return await service.get_top_users(limit)
+async def get_leaderboard(limit: int = 50):
+    # the shared call gets its own service, not the first caller's dependency
+    return await top_users_coalescer.run(limit, lambda: LeaderboardService().get_top_users(limit))
+
+@router.get("/stats")
+async def get_leaderboard_stats(service: LeaderboardService = Depends(get_service)):
+    """XP quantiles and tier thresholds from the periodic distribution snapshot."""
+    return await service.get_stats()
+
+@router.get("/live")
+async def stream_leaderboard():
+    """
+    Server-Sent Events: a `snapshot` of the top-N, then `diff` events as
+    ranks change. Replaces polling `/leaderboard/`.
+    """
+    return StreamingResponse(
+        feed.stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @router.get("/user/{user_id}")
 async def get_user_rank(user_id: str, service: LeaderboardService = Depends(get_service)):
     return await service.get_user_rank(user_id)
+
+@router.get("/history/user/{user_id}")
+async def get_user_rank_on(user_id: int, day: date, service: LeaderboardService = Depends(get_service)):
+    """Rank and XP from the archived snapshot in effect on `day`."""
+    return await service.get_user_rank_on(user_id, day)
@@ -1,15 +1,31 @@
-import os
+import asyncio
+from array import array
+from datetime import date
+from uuid import uuid4
+
 import redis.asyncio as redis
 from fastapi import HTTPException
 
-REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+from app.leaderboard.archive import (
+    LEADERBOARD_ARCHIVE_PAGE_SIZE,
+    LeaderboardArchive,
+    archive_for,
+    archive_path,
+    write_archive,
+)
+from app.leaderboard.stats import get_snapshot
+from app.redis_client import REDIS_URL, get_redis
+
 LEADERBOARD_KEY = "leaderboard:global"
+LEADERBOARD_ARCHIVE_KEY_PREFIX = "leaderboard:archive:"
+# lifetime of the temporary keys used by an export or import
+ARCHIVE_TMP_KEY_TTL_SECONDS = 3600
 
 
 class LeaderboardService:
-    def __init__(self):
-        # create a connection per service instance
-        self.r = redis.from_url(REDIS_URL, decode_responses=True)
+    def __init__(self, r: redis.Redis | None = None):
+        # share the process-wide pool unless a client is handed in
+        self.r = r or get_redis()
 
     async def get_top_users(self, limit: int = 50):
         entries = await self.r.zrevrange(LEADERBOARD_KEY, 0, limit - 1, withscores=True)
@@ -25,7 +41,101 @@ class LeaderboardService:
         score = await self.r.zscore(LEADERBOARD_KEY, user_id)
         if rank is None:
             raise HTTPException(status_code=404, detail="User not found in leaderboard")
-        return {"user": user_id, "rank": rank + 1, "xp": int(score)}
+        xp = int(score)
+        # percentile and tier come from the in-memory distribution snapshot
+        snapshot = get_snapshot()
+        return {
+            "user": user_id,
+            "rank": rank + 1,
+            "xp": xp,
+            "percentile": snapshot.percentile(xp) if snapshot else None,
+            "tier": snapshot.tier(xp) if snapshot else None,
+        }
+
+    async def get_stats(self):
+        snapshot = get_snapshot()
+        if snapshot is None:
+            raise HTTPException(status_code=503, detail="Leaderboard stats not ready")
+        return snapshot.to_dict()
+
+    async def export_snapshot(self, day: date | None = None, path: str | None = None) -> dict:
+        """
+        Write the current leaderboard to a columnar archive file.
+        The live key is first copied (ZUNIONSTORE of one key) to a temporary
+        key and the copy is paged, so members moving during the export are neither written
+        twice nor skipped.
+        """
+        path = path or archive_path(day or date.today())
+        tmp_key = f"{LEADERBOARD_KEY}:export:{uuid4().hex}"
+        xp, user_ids = array("q"), array("q")
+        skipped = start = 0
+        try:
+            async with self.r.pipeline(transaction=True) as pipe:
+                pipe.zunionstore(tmp_key, [LEADERBOARD_KEY])
+                # an abandoned export cleans itself up
+                pipe.expire(tmp_key, ARCHIVE_TMP_KEY_TTL_SECONDS)
+                await pipe.execute()
+            while True:
+                page = await self.r.zrange(
+                    tmp_key, start, start + LEADERBOARD_ARCHIVE_PAGE_SIZE - 1, withscores=True
+                )
+                for member, score in page:
+                    if not member.isdigit():
+                        skipped += 1
+                        continue
+                    user_ids.append(int(member))
+                    xp.append(int(score))
+                if len(page) < LEADERBOARD_ARCHIVE_PAGE_SIZE:
+                    break
+                start += LEADERBOARD_ARCHIVE_PAGE_SIZE
+        finally:
+            await self.r.delete(tmp_key)
+        await asyncio.to_thread(write_archive, path, xp, user_ids)
+        return {"path": path, "users": len(xp), "skipped": skipped}
+
+    async def import_snapshot(self, path: str, key: str | None = None) -> dict:
+        """
+        Load an archive into a sorted set (by default `leaderboard:archive:<date taken>`),
+        replacing its contents. Never touches the live leaderboard unless asked to.
+        Pages are loaded into a temporary key, one pipeline per page, and
+        renamed over the target at the end, so readers never see a partial
+        set and Redis is never blocked by one huge transaction.
+        """
+        with LeaderboardArchive(path) as archive:
+            key = key or f"{LEADERBOARD_ARCHIVE_KEY_PREFIX}{date.fromtimestamp(archive.taken_at).isoformat()}"
+            tmp_key = f"{key}:import:{uuid4().hex}"
+            try:
+                for start in range(0, len(archive), LEADERBOARD_ARCHIVE_PAGE_SIZE):
+                    end = min(start + LEADERBOARD_ARCHIVE_PAGE_SIZE, len(archive))
+                    async with self.r.pipeline(transaction=False) as pipe:
+                        pipe.zadd(tmp_key, {str(archive.user_ids[i]): archive.xp[i] for i in range(start, end)})
+                        # an abandoned import cleans itself up
+                        pipe.expire(tmp_key, ARCHIVE_TMP_KEY_TTL_SECONDS)
+                        await pipe.execute()
+                async with self.r.pipeline(transaction=True) as pipe:
+                    if len(archive):
+                        pipe.rename(tmp_key, key)
+                        pipe.persist(key)
+                    else:
+                        pipe.delete(key)
+                    await pipe.execute()
+            except BaseException:
+                await self.r.delete(tmp_key)
+                raise
+            return {"key": key, "users": len(archive)}
+
+    async def get_user_rank_on(self, user_id: int, day: date) -> dict:
+        """Rank from the archive in effect on `day`: binary searches over the mmap."""
+        path = archive_for(day)
+        if path is None:
+            raise HTTPException(status_code=404, detail="No leaderboard archive for that date")
+
+        def lookup():
+            with LeaderboardArchive(path) as archive:
+                return archive.lookup(user_id), archive.taken_at
 
-    async def close(self):
-        await self.r.close()
+        found, taken_at = await asyncio.to_thread(lookup)
+        if found is None:
+            raise HTTPException(status_code=404, detail="User not found in leaderboard archive")
+        rank, xp = found
+        return {"user": str(user_id), "rank": rank, "xp": xp, "day": day, "taken_at": taken_at}
@@ -0,0 +1,160 @@
+"""
+Precomputed XP distribution for percentile and tier lookups.
+
+One worker at a time (guarded by a Redis lock) walks `leaderboard:global`
+every LEADERBOARD_STATS_INTERVAL seconds and stores a compact snapshot:
+the user count plus at most LEADERBOARD_STATS_POINTS evenly spaced scores
+(the exact sorted scores when there are fewer users). Every worker loads
+that blob into memory, so percentiles are a bisect, not a Redis call.
+"""
+import asyncio
+import os
+import struct
+import time
+from array import array
+from bisect import bisect_left
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from app.redis_client import REDIS_URL
+from app.users.events import LEADERBOARD_KEY
+
+STATS_SNAPSHOT_KEY = "leaderboard:stats:snapshot"
+STATS_LOCK_KEY = "leaderboard:stats:lock"
+
+LEADERBOARD_STATS_INTERVAL = int(os.getenv("LEADERBOARD_STATS_INTERVAL", "60"))
+# how soon a worker with no snapshot yet looks for the lock winner's blob again
+LEADERBOARD_STATS_RETRY_SECONDS = float(os.getenv("LEADERBOARD_STATS_RETRY_SECONDS", "1"))
+LEADERBOARD_STATS_POINTS = int(os.getenv("LEADERBOARD_STATS_POINTS", "1001"))
+LEADERBOARD_STATS_PAGE_SIZE = int(os.getenv("LEADERBOARD_STATS_PAGE_SIZE", "10000"))
+# "name:min_percentile" pairs, highest tier first
+LEADERBOARD_TIERS = os.getenv(
+    "LEADERBOARD_TIERS", "diamond:99,platinum:95,gold:80,silver:50,bronze:0"
+)
+
+QUANTILES = (50, 75, 90, 95, 99)
+_HEADER = struct.Struct("<dQI")  # taken_at, users, points
+
+
+def parse_tiers(value: str) -> list[tuple[str, float]]:
+    tiers = []
+    for pair in value.split(","):
+        name, min_percentile = pair.split(":")
+        tiers.append((name.strip(), float(min_percentile)))
+    return sorted(tiers, key=lambda tier: tier[1], reverse=True)
+
+
+TIERS = parse_tiers(LEADERBOARD_TIERS)
+
+
+class DistributionSnapshot:
+    def __init__(self, users: int, points: array, taken_at: float):
+        self.users = users
+        self.points = points  # ascending scores
+        self.taken_at = taken_at
+
+    @classmethod
+    def from_scores(cls, scores: array, max_points: int = LEADERBOARD_STATS_POINTS) -> "DistributionSnapshot":
+        """Build from ascending scores, downsampling to `max_points` quantiles."""
+        n = len(scores)
+        if n <= max_points:
+            points = array("q", scores)
+        else:
+            points = array("q", (scores[i * (n - 1) // (max_points - 1)] for i in range(max_points)))
+        return cls(n, points, time.time())
+
+    def percentile(self, xp: int) -> float | None:
+        """Share of users (in %) with less XP than `xp`."""
+        if not self.points:
+            return None
+        return round(100 * bisect_left(self.points, xp) / len(self.points), 2)
+
+    def tier(self, xp: int) -> str | None:
+        percentile = self.percentile(xp)
+        if percentile is None:
+            return None
+        for name, min_percentile in TIERS:
+            if percentile >= min_percentile:
+                return name
+        return TIERS[-1][0]
+
+    def score_at(self, percentile: float) -> int | None:
+        """Lowest XP at or above the given percentile."""
+        if not self.points:
+            return None
+        index = min(int(len(self.points) * percentile / 100), len(self.points) - 1)
+        return self.points[index]
+
+    def to_dict(self) -> dict:
+        return {
+            "users": self.users,
+            "taken_at": self.taken_at,
+            "quantiles": {f"p{q}": self.score_at(q) for q in QUANTILES},
+            "tiers": [
+                {"tier": name, "min_percentile": min_percentile, "min_xp": self.score_at(min_percentile)}
+                for name, min_percentile in TIERS
+            ],
+        }
+
+    def to_bytes(self) -> bytes:
+        return _HEADER.pack(self.taken_at, self.users, len(self.points)) + self.points.tobytes()
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "DistributionSnapshot":
+        taken_at, users, count = _HEADER.unpack_from(blob)
+        points = array("q")
+        points.frombytes(blob[_HEADER.size:_HEADER.size + count * points.itemsize])
+        return cls(users, points, taken_at)
+
+
+async def build_snapshot(r: redis.Redis) -> DistributionSnapshot:
+    """Walk the sorted set in ascending pages of LEADERBOARD_STATS_PAGE_SIZE."""
+    scores = array("q")
+    start = 0
+    while True:
+        page = await r.zrange(
+            LEADERBOARD_KEY, start, start + LEADERBOARD_STATS_PAGE_SIZE - 1, withscores=True
+        )
+        scores.extend(int(score) for _member, score in page)
+        if len(page) < LEADERBOARD_STATS_PAGE_SIZE:
+            return DistributionSnapshot.from_scores(scores)
+        start += LEADERBOARD_STATS_PAGE_SIZE
+
+
+_snapshot: DistributionSnapshot | None = None
+
+
+def get_snapshot() -> DistributionSnapshot | None:
+    """This process's latest snapshot, or None before the first refresh."""
+    return _snapshot
+
+
+async def refresh(r: redis.Redis, blob_client: redis.Redis) -> DistributionSnapshot | None:
+    """
+    Rebuild the shared snapshot if this worker wins the lock, then load the
+    shared snapshot into memory. `blob_client` must not decode responses.
+    """
+    global _snapshot
+    if await r.set(STATS_LOCK_KEY, os.getpid(), nx=True, ex=LEADERBOARD_STATS_INTERVAL):
+        snapshot = await build_snapshot(r)
+        await blob_client.set(STATS_SNAPSHOT_KEY, snapshot.to_bytes())
+    blob = await blob_client.get(STATS_SNAPSHOT_KEY)
+    if blob:
+        _snapshot = DistributionSnapshot.from_bytes(blob)
+    return _snapshot
+
+
+async def run_refresher(r: redis.Redis):
+    # the shared client decodes responses; the snapshot blob is binary
+    blob_client = redis.from_url(REDIS_URL)
+    try:
+        while True:
+            try:
+                snapshot = await refresh(r, blob_client)
+            except RedisError:
+                snapshot = None
+            # at startup the lock winner may still be building the blob
+            await asyncio.sleep(LEADERBOARD_STATS_INTERVAL if snapshot else LEADERBOARD_STATS_RETRY_SECONDS)
+    finally:
+        await blob_client.aclose()
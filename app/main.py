@@ -1,20 +1,60 @@
-from fastapi import FastAPI, APIRouter
-from app.users.routers import router as users_router
-from app.leaderboard.routers import router as leaderboard_router
-
-
-
-app = FastAPI()
-
-router = APIRouter()
-
-
-
-
-app.include_router(users_router)
-app.include_router(leaderboard_router)
-
-
-@app.get("/")
-async def health():
-    return {"status": "ok"}
+import asyncio
+import contextlib
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+
+from app import metrics
+from app.leaderboard import live, stats
+from app.database import dispose_engine, get_engine
+from app.redis_client import close_redis, get_redis
+from app.users import maintenance
+from app.users.security import password_hasher
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs once per worker process: pools are created here, after the fork,
+    # never inherited from the gunicorn master or built at import time.
+    get_engine()
+    r = get_redis()
+    tasks = [
+        asyncio.create_task(metrics.run_flusher(r)),
+        asyncio.create_task(stats.run_refresher(r)),
+        asyncio.create_task(live.feed.run(r)),
+        asyncio.create_task(maintenance.run_scheduler(r)),
+    ]
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    with contextlib.suppress(Exception):
+        await metrics.flush(r)
+    password_hasher.shutdown()
+    await close_redis()
+    await dispose_engine()
+
+
+def create_app() -> FastAPI:
+    """
+    Build the FastAPI application. There is no module-level app, so
+    importing this module stays cheap; serve it with
+    `uvicorn --factory app.main:create_app` or
+    `gunicorn 'app.main:create_app()'`.
+    """
+    from app.users.routers import router as users_router
+    from app.leaderboard.routers import router as leaderboard_router
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(users_router)
+    app.include_router(leaderboard_router)
+
+    @app.get("/")
+    async def health():
+        return {"status": "ok"}
+
+    @app.get("/metrics")
+    async def get_metrics():
+        return await metrics.aggregate(get_redis())
+
+    return app
@@ -0,0 +1,65 @@
+"""
+Request-path counters.
+
+Counters are incremented in-process (no I/O on the hot path) and flushed
+to the `metrics:counters` Redis hash every METRICS_FLUSH_SECONDS by a
+background task started in the app lifespan, so GET /metrics reports the
+totals across every worker process.
+"""
+import asyncio
+import os
+from collections import Counter
+
+from redis.exceptions import RedisError
+
+METRICS_KEY = "metrics:counters"
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+_counters: Counter = Counter()
+
+
+def incr(name: str, value: int = 1):
+    _counters[name] += value
+
+
+def snapshot() -> dict[str, int]:
+    """Counters of this process not yet flushed to Redis."""
+    return dict(sorted(_counters.items()))
+
+
+def reset():
+    _counters.clear()
+
+
+async def flush(r) -> int:
+    """Move local counters into the shared Redis hash. Returns counters flushed."""
+    if not _counters:
+        return 0
+    pending = dict(_counters)
+    _counters.clear()
+    try:
+        async with r.pipeline(transaction=False) as pipe:
+            for name, value in pending.items():
+                pipe.hincrby(METRICS_KEY, name, value)
+            await pipe.execute()
+    except RedisError:
+        # keep the counts for the next attempt
+        _counters.update(pending)
+        raise
+    return len(pending)
+
+
+async def aggregate(r) -> dict[str, int]:
+    """Totals across all workers: the shared hash plus this process's pending counts."""
+    totals = Counter({name: int(value) for name, value in (await r.hgetall(METRICS_KEY)).items()})
+    totals.update(_counters)
+    return dict(sorted(totals.items()))
+
+
+async def run_flusher(r):
+    while True:
+        await asyncio.sleep(METRICS_FLUSH_SECONDS)
+        try:
+            await flush(r)
+        except RedisError:
+            pass
@@ -0,0 +1,95 @@
+"""
+Redis-backed sliding-window rate limiting.
+
+Limits are configured as "<requests>/<seconds>" strings, e.g.
+RATE_LIMIT_CHECKIN="5/60". Set RATE_LIMIT_ENABLED=false to turn them off.
+"""
+import os
+import time
+import uuid
+
+from fastapi import HTTPException, Request
+from redis.exceptions import RedisError
+
+from app import metrics
+from app.redis_client import get_redis
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+
+# KEYS: window key; ARGV: now_ms, window_ms, limit, member
+# Returns {allowed, retry_after_ms}.
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now - window)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    return {0, tonumber(oldest[2]) + window - now}
+end
+redis.call('ZADD', KEYS[1], now, ARGV[4])
+redis.call('PEXPIRE', KEYS[1], window)
+return {1, 0}
+"""
+
+
+def parse_limit(value: str) -> tuple[int, int]:
+    """Parse "<requests>/<seconds>" into (requests, seconds)."""
+    requests, seconds = value.split("/")
+    return int(requests), int(seconds)
+
+
+class SlidingWindowRateLimiter:
+    def __init__(self, name: str, limit: int, window_seconds: int):
+        self.name = name
+        self.limit = limit
+        self.window_ms = window_seconds * 1000
+        self._script = None
+
+    async def hit(self, key: str) -> tuple[bool, float]:
+        """
+        Record one request for `key`.
+        Returns (allowed, retry_after_seconds); rejected requests are not counted.
+        """
+        r = get_redis()
+        if self._script is None:
+            self._script = r.register_script(SLIDING_WINDOW_SCRIPT)
+        now_ms = int(time.time() * 1000)
+        allowed, retry_after_ms = await self._script(
+            keys=[f"ratelimit:{self.name}:{key}"],
+            args=[now_ms, self.window_ms, self.limit, f"{now_ms}-{uuid.uuid4().hex[:8]}"],
+            client=r,
+        )
+        return bool(allowed), max(int(retry_after_ms), 0) / 1000
+
+
+def rate_limit(name: str, default: str, key_param: str | None = None):
+    """
+    Build a route dependency limiting requests per route and per caller.
+    The caller is the `key_param` path parameter when given, else the client IP.
+    Redis failures let the request through (fail-open) and are counted.
+    """
+    limit, window = parse_limit(os.getenv(f"RATE_LIMIT_{name.upper()}", default))
+    limiter = SlidingWindowRateLimiter(name, limit, window)
+
+    async def dependency(request: Request):
+        if not RATE_LIMIT_ENABLED:
+            return
+        if key_param is not None:
+            key = str(request.path_params.get(key_param))
+        else:
+            key = request.client.host if request.client else "unknown"
+        try:
+            allowed, retry_after = await limiter.hit(key)
+        except RedisError:
+            metrics.incr(f"ratelimit.{name}.errors")
+            return
+        if not allowed:
+            metrics.incr(f"ratelimit.{name}.rejected")
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(max(int(retry_after), 1))},
+            )
+        metrics.incr(f"ratelimit.{name}.allowed")
+
+    return dependency
@@ -0,0 +1,24 @@
+import os
+import redis.asyncio as redis
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+
+_client: redis.Redis | None = None
+
+
+def get_redis() -> redis.Redis:
+    """
+    Shared Redis client for request-path helpers (rate limiting, caches).
+    Built on first use; the underlying connection pool is reused by every request.
+    """
+    global _client
+    if _client is None:
+        _client = redis.from_url(REDIS_URL, decode_responses=True)
+    return _client
+
+
+async def close_redis():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
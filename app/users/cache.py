@@ -0,0 +1,108 @@
+"""
+Redis-side caches for user data.
+
+Check-in bitmap: one key per day (`checkins:YYYY-MM-DD`), bit N set when
+user N has a committed check-in that day. It lets repeat check-ins be
+rejected without touching Postgres and gives daily-active counts via BITCOUNT.
+The database stays the source of truth: a missing bit only means "ask the DB".
+
+Username cache: the `users:by_username` hash maps exact usernames to user
+ids ("Probe" and "probe" can be different users). Entries are dropped when the user is deleted, and readers verify
+the row they load, so a stale entry only costs one extra query.
+"""
+import os
+from datetime import date
+
+from redis.exceptions import RedisError
+
+from app import metrics
+from app.redis_client import get_redis
+
+# Keep yesterday's bitmap around for DAU queries, then let Redis drop it.
+CHECKIN_BITMAP_TTL_SECONDS = int(os.getenv("CHECKIN_BITMAP_TTL_SECONDS", str(2 * 24 * 3600)))
+
+
+USERNAME_CACHE_KEY = "users:by_username"
+
+
+def checkin_bitmap_key(day: date) -> str:
+    return f"checkins:{day.isoformat()}"
+
+
+async def has_checked_in(user_id: int, day: date) -> bool:
+    """True only when the bitmap says so; Redis errors count as a miss."""
+    try:
+        return bool(await get_redis().getbit(checkin_bitmap_key(day), user_id))
+    except RedisError:
+        metrics.incr("checkin_bitmap.errors")
+        return False
+
+
+async def set_checked_in(user_id: int, day: date, checked_in: bool = True):
+    """Record (or clear) a committed check-in. Call only after the DB commit."""
+    key = checkin_bitmap_key(day)
+    try:
+        async with get_redis().pipeline(transaction=False) as pipe:
+            pipe.setbit(key, user_id, 1 if checked_in else 0)
+            pipe.expire(key, CHECKIN_BITMAP_TTL_SECONDS)
+            await pipe.execute()
+    except RedisError:
+        metrics.incr("checkin_bitmap.errors")
+
+
+async def mark_checked_in_many(user_ids: list[int], day: date):
+    """Record many committed check-ins for `day` in one pipeline."""
+    if not user_ids:
+        return
+    key = checkin_bitmap_key(day)
+    try:
+        async with get_redis().pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.setbit(key, user_id, 1)
+            pipe.expire(key, CHECKIN_BITMAP_TTL_SECONDS)
+            await pipe.execute()
+    except RedisError:
+        metrics.incr("checkin_bitmap.errors")
+
+
+async def clear_checked_in(days: list[date]):
+    """Drop whole daily bitmaps (e.g. after user ids were reset)."""
+    try:
+        await get_redis().delete(*(checkin_bitmap_key(day) for day in days))
+    except RedisError:
+        metrics.incr("checkin_bitmap.errors")
+
+
+async def count_checked_in(day: date) -> int:
+    return await get_redis().bitcount(checkin_bitmap_key(day))
+
+
+async def get_cached_user_id(username: str) -> int | None:
+    try:
+        user_id = await get_redis().hget(USERNAME_CACHE_KEY, username)
+    except RedisError:
+        metrics.incr("username_cache.errors")
+        return None
+    metrics.incr("username_cache.hits" if user_id else "username_cache.misses")
+    return int(user_id) if user_id else None
+
+
+async def cache_username(username: str, user_id: int):
+    try:
+        await get_redis().hset(USERNAME_CACHE_KEY, username, user_id)
+    except RedisError:
+        metrics.incr("username_cache.errors")
+
+
+async def forget_username(username: str):
+    try:
+        await get_redis().hdel(USERNAME_CACHE_KEY, username)
+    except RedisError:
+        metrics.incr("username_cache.errors")
+
+
+async def clear_username_cache():
+    try:
+        await get_redis().delete(USERNAME_CACHE_KEY)
+    except RedisError:
+        metrics.incr("username_cache.errors")
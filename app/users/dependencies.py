@@ -1,13 +1,17 @@
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.database import get_db
+from sqlalchemy.orm import sessionmaker
+from app.database import get_db, get_session_factory
 from .repositories import UserRepository
 from .services import UserService
 
-def get_user_service(db: AsyncSession = Depends(get_db)) -> UserService:
+def get_user_service(
+    db: AsyncSession = Depends(get_db),
+    session_factory: sessionmaker = Depends(get_session_factory),
+) -> UserService:
     """
     Dependency provider for UserService.
     Wires together DB session -> UserRepository -> UserService.
     """
     repo = UserRepository(db)
-    return UserService(repo)
+    return UserService(repo, session_factory)
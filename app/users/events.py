@@ -1,27 +1,42 @@
 import json
 import os
+import time
 from datetime import datetime
-import redis.asyncio as redis
 
-# Get Redis URL from environment, fallback to local default
-REDIS_URL = os.getenv("REDIS_URL", "redis://redis-server:6379")
+from app.redis_client import get_redis
+
 LEADERBOARD_STREAM = "leaderboard_events"
 LEADERBOARD_KEY = "leaderboard:global"
+LEADERBOARD_VERSIONS_KEY = "leaderboard:versions"
+# pub/sub channel announcing that `leaderboard:global` itself has changed
+LEADERBOARD_UPDATES_CHANNEL = "leaderboard:updates"
 
-async def clear_leaderboard():
-    r = redis.from_url(REDIS_URL, decode_responses=True)
-    deleted = await r.delete(LEADERBOARD_KEY)
-    await r.aclose()
-    print(f"✅ Cleared leaderboard ({deleted} key(s) removed).")
+# Stream trimming: keep roughly the last N entries (MAXLEN), or, when a
+# retention window is configured, drop entries older than it (MINID).
+# Set LEADERBOARD_STREAM_MAXLEN=0 to disable trimming entirely.
+LEADERBOARD_STREAM_MAXLEN = int(os.getenv("LEADERBOARD_STREAM_MAXLEN", "100000"))
+LEADERBOARD_STREAM_RETENTION_SECONDS = int(
+    os.getenv("LEADERBOARD_STREAM_RETENTION_SECONDS", "0")
+)
 
-async def publish_leaderboard_event(
+
+def stream_trim_args() -> dict:
+    """Build the XADD trimming arguments (approximate, so Redis trims whole nodes)."""
+    if LEADERBOARD_STREAM_RETENTION_SECONDS > 0:
+        min_ms = int((time.time() - LEADERBOARD_STREAM_RETENTION_SECONDS) * 1000)
+        return {"minid": f"{min_ms}-0", "approximate": True}
+    if LEADERBOARD_STREAM_MAXLEN > 0:
+        return {"maxlen": LEADERBOARD_STREAM_MAXLEN, "approximate": True}
+    return {}
+
+
+def build_leaderboard_event(
     event_type: str,
     user_id: int,
     xp: int,
-    streak: int | None = None
-):
-    """Publish leaderboard-related events (user_created, checkin)."""
-    r = redis.from_url(REDIS_URL, decode_responses=True)
+    streak: int | None = None,
+    version: int | None = None
+) -> dict:
     event = {
         "event": event_type,
         "user_id": user_id,
@@ -30,6 +45,70 @@ async def publish_leaderboard_event(
     }
     if streak is not None:
         event["streak"] = streak
+    if version is not None:
+        event["version"] = version
+    return event
+
+
+def build_tombstone_event(user_id: int | str, version: int) -> dict:
+    """
+    A `deleted` event: the projection removes the member and keeps `version`
+    as its tombstone, so older events for it are rejected even on replay.
+    """
+    return build_leaderboard_event("deleted", user_id, xp=0, version=version)
+
+
+async def reset_leaderboard():
+    """
+    Drop the leaderboard, its versions and the event stream in one transaction.
+    Only for a truncate, where user ids restart and no event or tombstone
+    keyed by an old id may survive to be applied to a new user.
+    """
+    async with get_redis().pipeline(transaction=True) as pipe:
+        pipe.delete(LEADERBOARD_KEY, LEADERBOARD_VERSIONS_KEY, LEADERBOARD_STREAM)
+        pipe.publish(LEADERBOARD_UPDATES_CHANNEL, "cleared")
+        deleted, _receivers = await pipe.execute()
+    print(f"✅ Reset leaderboard ({deleted} key(s) removed).")
+
+async def find_orphaned_members(user_ids: set[int]) -> dict[str, int]:
+    """
+    Leaderboard members that are not in `user_ids`, with the version
+    projected for each (0 if none).
+    """
+    known = {str(user_id) for user_id in user_ids}
+    r = get_redis()
+    orphans = [
+        member
+        async for member, _score in r.zscan_iter(LEADERBOARD_KEY, count=1000)
+        if member not in known
+    ]
+    if not orphans:
+        return {}
+    versions = await r.hmget(LEADERBOARD_VERSIONS_KEY, orphans)
+    return {member: int(version or 0) for member, version in zip(orphans, versions)}
+
+async def publish_leaderboard_event(
+    event_type: str,
+    user_id: int,
+    xp: int,
+    streak: int | None = None,
+    version: int | None = None
+):
+    """Publish leaderboard-related events (user_created, checkin, deleted)."""
+    event = build_leaderboard_event(event_type, user_id, xp, streak, version)
+    await get_redis().xadd(LEADERBOARD_STREAM, event, **stream_trim_args())
+
 
-    await r.xadd(LEADERBOARD_STREAM, event)
-    await r.aclose()
+async def publish_leaderboard_events(events: list[dict]) -> int:
+    """
+    Publish many events built with `build_leaderboard_event` in one pipeline.
+    Returns the number of events written.
+    """
+    if not events:
+        return 0
+    trim = stream_trim_args()
+    async with get_redis().pipeline(transaction=False) as pipe:
+        for event in events:
+            pipe.xadd(LEADERBOARD_STREAM, event, **trim)
+        await pipe.execute()
+    return len(events)
@@ -0,0 +1,61 @@
+"""
+Periodic check-in history maintenance.
+
+Every CHECKIN_MAINTENANCE_INTERVAL seconds one worker (guarded by a Redis
+lock) creates the check-in partitions for this and the next
+CHECKIN_PARTITION_MONTHS - 1 months, ahead of the rows that need them, and
+recomputes the daily rollups of the last CHECKIN_ROLLUP_LOOKBACK_DAYS days
+(never today's). A failed partition does not stop the rollups.
+
+Run once with: python -m app.users.maintenance
+"""
+import asyncio
+import os
+from datetime import date, timedelta
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import metrics
+from app.database import dispose_engine, get_sessionmaker
+from app.redis_client import close_redis
+from app.users.repositories import UserRepository
+from app.users.services import UserService
+
+MAINTENANCE_LOCK_KEY = "checkins:maintenance:lock"
+
+CHECKIN_MAINTENANCE_INTERVAL = int(os.getenv("CHECKIN_MAINTENANCE_INTERVAL", "3600"))
+CHECKIN_ROLLUP_LOOKBACK_DAYS = int(os.getenv("CHECKIN_ROLLUP_LOOKBACK_DAYS", "7"))
+
+
+async def run_maintenance(session_factory) -> dict:
+    """Create upcoming partitions and refresh recent rollups, in one session."""
+    yesterday = date.today() - timedelta(days=1)
+    start = yesterday - timedelta(days=CHECKIN_ROLLUP_LOOKBACK_DAYS - 1)
+    async with session_factory() as session:
+        service = UserService(UserRepository(session))
+        return await service.refresh_checkin_rollups(start, yesterday)
+
+
+async def run_scheduler(r: redis.Redis):
+    while True:
+        try:
+            if await r.set(MAINTENANCE_LOCK_KEY, os.getpid(), nx=True, ex=CHECKIN_MAINTENANCE_INTERVAL):
+                await run_maintenance(get_sessionmaker())
+        except (RedisError, SQLAlchemyError):
+            metrics.incr("checkins.maintenance_errors")
+        await asyncio.sleep(CHECKIN_MAINTENANCE_INTERVAL)
+
+
+async def main():
+    try:
+        result = await run_maintenance(get_sessionmaker())
+        print(f"✅ Check-in maintenance: {result}")
+    finally:
+        await close_redis()
+        await dispose_engine()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,7 +1,7 @@
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import String, DATE
+from sqlalchemy import String, DATE, DateTime, ForeignKey, Index, DDL, event, func
 
-from datetime import date
+from datetime import date, datetime
 
 from app.database import Base
 
@@ -21,5 +21,72 @@ class User(Base):
     last_checkin: Mapped[date | None] = mapped_column(DATE, nullable=True)
     last_streak_reset: Mapped[date | None] = mapped_column(DATE, nullable=True)
 
+    # Bumped by SQLAlchemy on every UPDATE; carried on leaderboard events so
+    # the Redis projection can apply them idempotently and reject stale ones.
+    version: Mapped[int] = mapped_column(default=1, server_default="1")
+
+    # Change cursor for incremental leaderboard reconciliation.
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        index=True,
+    )
+
+    __table_args__ = (
+        # case-insensitive username lookups
+        Index("ix_users_username_lower", func.lower(username)),
+    )
+    __mapper_args__ = {"version_id_col": version, "eager_defaults": True}
+
     def __repr__(self) -> str:
         return f"<User(username={self.username}, xp={self.xp}, streak={self.streak})>"
+
+
+
+class Checkin(Base):
+    """
+    Append-only check-in history, one row per user per day.
+    On Postgres the table is range-partitioned by month on `day`
+    (monthly partitions are created by the migration and by
+    CheckinRepository.ensure_partitions).
+    """
+    __tablename__ = "checkins"
+    __table_args__ = (
+        Index("ix_checkins_day", "day"),
+        {"postgresql_partition_by": "RANGE (day)"},
+    )
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    day: Mapped[date] = mapped_column(DATE, primary_key=True)
+    xp: Mapped[int]
+    streak: Mapped[int]
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+
+    def __repr__(self) -> str:
+        return f"<Checkin(user_id={self.user_id}, day={self.day}, streak={self.streak})>"
+
+
+# A partitioned table rejects rows with no matching partition; give tables
+# built through metadata.create_all (tests, scripts) a catch-all partition.
+event.listen(
+    Checkin.__table__,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS checkins_default PARTITION OF checkins DEFAULT")
+    .execute_if(dialect="postgresql"),
+)
+
+
+class CheckinDailyStat(Base):
+    """Pre-aggregated daily check-in counts, refreshed by the rollup job."""
+    __tablename__ = "checkin_daily_stats"
+
+    day: Mapped[date] = mapped_column(DATE, primary_key=True)
+    checkins: Mapped[int] = mapped_column(default=0)
+    refreshed_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
@@ -1,8 +1,71 @@
+import os
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
-from .models import User
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import bindparam, cast, column, select, values, delete, func, insert, text, tuple_, update
+from .models import Checkin, CheckinDailyStat, User
 from .schemas import UserCreate, UserUpdate
 
+DELETE_CHUNK_SIZE = int(os.getenv("DELETE_CHUNK_SIZE", "5000"))
+
+
+# Hot-path statements are built once with bind parameters. SQLAlchemy
+# memoizes the cache key of a statement object, so executing one of these
+# skips both constructing the statement and compiling it again.
+
+USER_BY_ID = select(User).where(User.id == bindparam("user_id"))
+
+USER_BY_USERNAME = select(User).where(User.username == bindparam("username"))
+
+USER_BY_USERNAME_CI = (
+    select(User)
+    .where(func.lower(User.username) == bindparam("lowered"))
+    .order_by((User.username == bindparam("username")).desc(), User.id)
+    .limit(1)
+)
+
+CHECKIN_STATES = select(
+    User.id,
+    User.xp,
+    User.streak,
+    User.max_streak,
+    User.frozen_days,
+    User.last_checkin,
+    User.last_streak_reset,
+    User.version,
+).where(User.id.in_(bindparam("user_ids", expanding=True)))
+
+# SET parameters cannot reuse column names, hence the new_ prefix
+SAVE_CHECKIN = (
+    update(User)
+    .where(User.id == bindparam("user_id"), User.version == bindparam("expected_version"))
+    .values(
+        xp=bindparam("new_xp"),
+        streak=bindparam("new_streak"),
+        max_streak=bindparam("new_max_streak"),
+        frozen_days=bindparam("new_frozen_days"),
+        last_checkin=bindparam("new_last_checkin"),
+        last_streak_reset=bindparam("new_last_streak_reset"),
+        version=bindparam("new_version"),
+    )
+    .returning(User)
+)
+
+
+def save_checkin_params(state) -> dict:
+    return {
+        "user_id": state.id,
+        "expected_version": state.version,
+        "new_xp": state.xp,
+        "new_streak": state.streak,
+        "new_max_streak": state.max_streak,
+        "new_frozen_days": state.frozen_days,
+        "new_last_checkin": state.last_checkin,
+        "new_last_streak_reset": state.last_streak_reset,
+        "new_version": state.version + 1,
+    }
+
 
 class UserRepository:
     def __init__(self, db: AsyncSession):
@@ -19,12 +82,24 @@ class UserRepository:
         await self.db.refresh(user)
         return user
 
-    async def get_by_id(self, user_id: int) -> User | None:
-        result = await self.db.execute(select(User).where(User.id == user_id))
+    async def get_by_id(self, user_id: int, fresh: bool = False) -> User | None:
+        """`fresh` overwrites an already loaded instance with the current row."""
+        result = await self.db.execute(
+            USER_BY_ID,
+            {"user_id": user_id},
+            execution_options={"populate_existing": fresh},
+        )
         return result.scalar_one_or_none()
 
     async def get_by_username(self, username: str) -> User | None:
-        result = await self.db.execute(select(User).where(User.username == username))
+        result = await self.db.execute(USER_BY_USERNAME, {"username": username})
+        return result.scalar_one_or_none()
+
+    async def get_by_username_ci(self, username: str) -> User | None:
+        """Case-insensitive lookup (uses ix_users_username_lower); an exact match wins."""
+        result = await self.db.execute(
+            USER_BY_USERNAME_CI, {"lowered": username.lower(), "username": username}
+        )
         return result.scalar_one_or_none()
 
     async def list_all(self) -> list[User]:
@@ -32,20 +107,291 @@ class UserRepository:
         result = await self.db.execute(select(User))
         return result.scalars().all()
 
+    async def list_changed_since(
+        self,
+        since: datetime | None,
+        after_id: int = 0,
+        limit: int = 1000
+    ) -> list:
+        """
+        Return (id, xp, version, updated_at) rows changed after the
+        (since, after_id) cursor, ordered by updated_at then id.
+        """
+        stmt = select(User.id, User.xp, User.version, User.updated_at)
+        if since is not None:
+            stmt = stmt.where(tuple_(User.updated_at, User.id) > (since, after_id))
+        stmt = stmt.order_by(User.updated_at, User.id).limit(limit)
+        result = await self.db.execute(stmt)
+        return result.all()
+
+    async def get_checkin_states(self, user_ids: list[int]) -> dict[int, SimpleNamespace]:
+        """
+        Load the check-in relevant fields of many users in one query, as plain
+        objects detached from the session (safe to mutate without flushing).
+        """
+        result = await self.db.execute(CHECKIN_STATES, {"user_ids": list(user_ids)})
+        return {row.id: SimpleNamespace(**row._mapping) for row in result.all()}
+
+    async def save_checkin(self, state) -> User | None:
+        """
+        Write a check-in state (from `get_checkin_states`) if the row is still
+        at `state.version`, returning the updated user; None means another
+        write got there first. Does not commit.
+        """
+        result = await self.db.execute(
+            SAVE_CHECKIN,
+            save_checkin_params(state),
+            execution_options={"populate_existing": True},
+        )
+        return result.scalar_one_or_none()
+
+    async def bulk_update(self, rows: list[dict]) -> set[int]:
+        """
+        Update many users in one set-based statement:
+        UPDATE users ... FROM (VALUES ...) v WHERE id = v.id AND version = v.version.
+        Each row carries the `version` it was read at, which is bumped.
+        Returns the ids actually updated; a missing id changed meanwhile.
+        Does not commit.
+        """
+        if not rows:
+            return set()
+        names = list(rows[0])
+        columns = User.__table__.c
+        # a CTE, since SQLite has no column aliases on a VALUES subquery
+        v = values(
+            *(column(name, columns[name].type) for name in names), name="v"
+        ).data([tuple(row[name] for name in names) for row in rows]).cte("v")
+        # Postgres types an all-NULL VALUES column as text, so cast explicitly
+        if (await self.db.connection()).dialect.name == "postgresql":
+            new_value = lambda name: cast(v.c[name], columns[name].type)
+        else:
+            new_value = lambda name: v.c[name]
+        result = await self.db.execute(
+            update(User)
+            .where(User.id == v.c.id, User.version == v.c.version)
+            .values({
+                **{name: new_value(name) for name in names if name not in ("id", "version")},
+                "version": User.version + 1,
+            })
+            .returning(User.id)
+            .execution_options(synchronize_session=False)
+        )
+        return set(result.scalars().all())
+
     async def update(self, user: User, payload: UserUpdate) -> User:
-        for field, value in payload.model_dump(exclude_unset=True).items():
+        """
+        Write the set fields. The UPDATE is guarded by the version the user
+        was loaded at and raises StaleDataError if the row changed meanwhile.
+        """
+        for field, value in payload.model_dump(exclude_unset=True, exclude={"expected_version"}).items():
             setattr(user, field, value)
         await self.db.commit()
         await self.db.refresh(user)
         return user
 
+    async def increment_xp(self, user_id: int, delta: int) -> User | None:
+        """
+        Atomically add `delta` to a user's XP (`xp = xp + :delta`) in one
+        UPDATE ... RETURNING, without reading the row first.
+        """
+        result = await self.db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(xp=User.xp + delta, version=User.version + 1)
+            .returning(User),
+            execution_options={"populate_existing": True},
+        )
+        user = result.scalar_one_or_none()
+        await self.db.commit()
+        return user
+
+    async def set_password(self, user_id: int, password_hash: str, old_password_hash: str) -> bool:
+        """
+        Replace a stored password hash without loading the user, only if it
+        is still `old_password_hash`. Returns False when it changed meanwhile.
+        """
+        result = await self.db.execute(
+            update(User)
+            .where(User.id == user_id, User.password == old_password_hash)
+            .values(password=password_hash, version=User.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        await self.db.commit()
+        return result.rowcount > 0
+
     async def delete(self, user: User) -> User:
         await self.db.delete(user)
         await self.db.commit()
         return user
 
+    async def delete_in_chunks(self, chunk_size: int = DELETE_CHUNK_SIZE):
+        """
+        Delete every user in id order, `chunk_size` rows per transaction, so
+        locks are held briefly and at most one chunk of ids is in memory.
+        Yields the (id, version) rows deleted by each committed chunk.
+        """
+        last_id = 0
+        while True:
+            next_ids = (
+                select(User.id).where(User.id > last_id).order_by(User.id).limit(chunk_size)
+            )
+            result = await self.db.execute(
+                delete(User)
+                .where(User.id.in_(next_ids))
+                .returning(User.id, User.version)
+                .execution_options(synchronize_session=False)
+            )
+            deleted_rows = result.all()
+            await self.db.commit()
+            if not deleted_rows:
+                return
+            yield deleted_rows
+            last_id = max(row.id for row in deleted_rows)
+
     async def delete_all(self) -> int:
-        result = await self.db.execute(delete(User).returning(User.id))
-        deleted_ids = result.scalars().all()
+        deleted = 0
+        async for deleted_rows in self.delete_in_chunks():
+            deleted += len(deleted_rows)
+        return deleted
+
+    async def truncate(self) -> int:
+        """
+        Empty the users table (and, by cascade, check-in history) in one
+        statement. Intended for test environments: it takes an exclusive
+        lock and restarts the id sequence. Falls back to DELETE off Postgres.
+        """
+        count = await self.db.scalar(select(func.count()).select_from(User))
+        if (await self.db.connection()).dialect.name == "postgresql":
+            await self.db.execute(text("TRUNCATE users RESTART IDENTITY CASCADE"))
+        else:
+            await self.db.execute(delete(User).execution_options(synchronize_session=False))
         await self.db.commit()
-        return len(deleted_ids)
+        return count
+
+
+
+def _add_months(day: date, months: int) -> date:
+    month_index = day.year * 12 + day.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+class CheckinRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _dialect_name(self) -> str:
+        return (await self.db.connection()).dialect.name
+
+    async def add_many(self, rows: list[dict]) -> int:
+        """
+        Insert check-in rows (user_id, day, xp, streak) in one statement.
+        A row for an existing (user_id, day) overwrites it, so replays are safe.
+        Does not commit: callers write history in their own transaction.
+        """
+        if not rows:
+            return 0
+        dialect = await self._dialect_name()
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            stmt = dialect_insert(Checkin)
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            stmt = dialect_insert(Checkin)
+        else:
+            await self.db.execute(insert(Checkin), rows)
+            return len(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Checkin.user_id, Checkin.day],
+            set_={"xp": stmt.excluded.xp, "streak": stmt.excluded.streak},
+        )
+        await self.db.execute(stmt, rows)
+        return len(rows)
+
+    async def add(self, user_id: int, day: date, xp: int, streak: int):
+        await self.add_many([{"user_id": user_id, "day": day, "xp": xp, "streak": streak}])
+
+    async def calendar(self, user_id: int, start: date, end: date) -> list[Checkin]:
+        """A user's check-ins between start and end (inclusive), oldest first."""
+        result = await self.db.execute(
+            select(Checkin)
+            .where(Checkin.user_id == user_id, Checkin.day.between(start, end))
+            .order_by(Checkin.day)
+        )
+        return result.scalars().all()
+
+    async def _raw_daily_counts(self, start: date, end: date) -> dict[date, int]:
+        result = await self.db.execute(
+            select(Checkin.day, func.count())
+            .where(Checkin.day.between(start, end))
+            .group_by(Checkin.day)
+        )
+        return {day: count for day, count in result.all()}
+
+    async def daily_counts(self, start: date, end: date) -> list[tuple[date, int]]:
+        """
+        Check-ins per day between start and end (inclusive).
+        Rolled-up days come from checkin_daily_stats; today (still open) and
+        days without a rollup are counted from the raw rows.
+        """
+        result = await self.db.execute(
+            select(CheckinDailyStat.day, CheckinDailyStat.checkins)
+            .where(CheckinDailyStat.day.between(start, end), CheckinDailyStat.day < date.today())
+        )
+        counts = {day: count for day, count in result.all()}
+
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        missing = [day for day in days if day not in counts]
+        if missing:
+            raw = await self._raw_daily_counts(missing[0], missing[-1])
+            for day in missing:
+                counts[day] = raw.get(day, 0)
+        return [(day, counts[day]) for day in days]
+
+    async def refresh_rollups(self, start: date, end: date) -> int:
+        """
+        Recompute daily rollups for start..end (inclusive). Only closed days
+        are rolled up: `end` is clamped to yesterday. Returns days written.
+        """
+        end = min(end, date.today() - timedelta(days=1))
+        if start > end:
+            return 0
+        raw = await self._raw_daily_counts(start, end)
+        rows = [
+            {"day": start + timedelta(days=i), "checkins": raw.get(start + timedelta(days=i), 0)}
+            for i in range((end - start).days + 1)
+        ]
+        await self.db.execute(
+            delete(CheckinDailyStat).where(CheckinDailyStat.day.between(start, end))
+        )
+        await self.db.execute(insert(CheckinDailyStat), rows)
+        await self.db.commit()
+        return len(rows)
+
+    async def invalidate_rollups(self, days: set[date]):
+        """
+        Drop the rollups of days that received late check-ins, so they are
+        counted from the raw rows until the next refresh. Does not commit.
+        """
+        if days:
+            await self.db.execute(delete(CheckinDailyStat).where(CheckinDailyStat.day.in_(days)))
+
+    async def ensure_partitions(self, start: date, months: int = 3) -> list[str]:
+        """
+        Create the monthly partitions covering `months` months from `start`'s
+        month, if missing, each in its own transaction (so the months before
+        a failing one are kept). No-op on databases without table partitioning.
+        """
+        if await self._dialect_name() != "postgresql":
+            return []
+        created = []
+        for offset in range(months):
+            lower = _add_months(start, offset)
+            upper = _add_months(lower, 1)
+            name = f"checkins_y{lower.year}m{lower.month:02d}"
+            await self.db.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF checkins "
+                f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+            ))
+            await self.db.commit()
+            created.append(name)
+        return created
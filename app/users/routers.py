@@ -1,13 +1,34 @@
 import random
+from datetime import date, timedelta
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.users.schemas import UserCreate, UserRead, UserUpdate, UserLog
+from sqlalchemy.orm import sessionmaker
+from app.database import get_session_factory
+from app.users.schemas import (
+    BulkCheckinRequest,
+    BulkCheckinResult,
+    CheckinRead,
+    DailyCheckinCount,
+    UserCreate,
+    UserLog,
+    UserLogin,
+    UserLookup,
+    UserRead,
+    UserUpdate,
+    XpIncrement,
+)
 from app.users.services import UserService
 from app.users.dependencies import get_user_service
+from app.coalesce import RequestCoalescer
+from app.ratelimit import rate_limit
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+MAX_STATS_RANGE_DAYS = 366
+
+get_user_coalescer = RequestCoalescer("get_user")
+
 
 # Create endpoints
 @router.post("/", response_model=UserRead)
@@ -42,12 +63,93 @@ async def seed_users(
     return users
 
 
+@router.post("/lookup", response_model=UserRead)
+async def lookup_user(
+    payload: UserLookup,
+    service: UserService = Depends(get_user_service)
+):
+    """Find a user by username, case-insensitively."""
+    user = await service.find_user_by_username(payload.username)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+
+@router.post("/login", response_model=UserRead)
+async def login_user(
+    payload: UserLogin,
+    service: UserService = Depends(get_user_service)
+):
+    """Check a username/password pair and return the user."""
+    return await service.authenticate(payload.username, payload.password)
+
+
+@router.get("/stats/active")
+async def get_active_users(
+    day: date | None = None,
+    service: UserService = Depends(get_user_service)
+):
+    """Daily active users (check-ins) for `day`, defaulting to today."""
+    day = day or date.today()
+    return {"day": day, "active_users": await service.count_active_users(day)}
+
+
+def stats_range(start: date | None = None, end: date | None = None) -> tuple[date, date]:
+    """Resolve a start/end query range, defaulting to the last 30 days."""
+    end = end or date.today()
+    start = start or end - timedelta(days=29)
+    if start > end or (end - start).days >= MAX_STATS_RANGE_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"start must be before end and span at most {MAX_STATS_RANGE_DAYS} days",
+        )
+    return start, end
+
+
+@router.get("/stats/checkins", response_model=list[DailyCheckinCount])
+async def get_daily_checkins(
+    days: tuple[date, date] = Depends(stats_range),
+    service: UserService = Depends(get_user_service)
+):
+    """Check-ins per day, from the daily rollups plus today's raw rows."""
+    return await service.daily_checkin_counts(*days)
+
+
+@router.post("/stats/checkins/rollup")
+async def rollup_daily_checkins(
+    days: tuple[date, date] = Depends(stats_range),
+    service: UserService = Depends(get_user_service)
+):
+    """Recompute daily check-in rollups and create upcoming partitions."""
+    return await service.refresh_checkin_rollups(*days)
+
+
+@router.get("/{user_id}/checkins", response_model=list[CheckinRead])
+async def get_user_checkins(
+    user_id: int,
+    days: tuple[date, date] = Depends(stats_range),
+    service: UserService = Depends(get_user_service)
+):
+    """A user's check-in calendar for the range (default: last 30 days)."""
+    return await service.checkin_calendar(user_id, *days)
+
+
 @router.get("/{user_id}", response_model=UserRead)
 async def get_user(
     user_id: int,
-    service: UserService = Depends(get_user_service)
+    session_factory: sessionmaker = Depends(get_session_factory)
 ):
-    user = await service.find_user_by_id(user_id)
+    """
+    Concurrent lookups of the same user share one query. The shared call
+    runs on its own session and returns a plain UserRead, so it never
+    depends on (or leaks) the session of whichever request started it.
+    """
+    async def load_user() -> UserRead | None:
+        async with session_factory() as session:
+            user = await UserService.with_session(session).find_user_by_id(user_id)
+            return UserRead.model_validate(user) if user else None
+
+    user = await get_user_coalescer.run(user_id, load_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -95,17 +197,40 @@ async def delete_user(
 
 @router.delete("/", response_model=dict)
 async def delete_all_users(
+    truncate: bool = False,
     service: UserService = Depends(get_user_service)
 ):
     """
     Delete all users from the database.
     ⚠️ Use with caution — this wipes the entire table.
+    `truncate=true` is a fast path for test environments (ALLOW_TRUNCATE).
     """
-    deleted_count = await service.delete_all_users()
+    deleted_count = await service.delete_all_users(truncate)
     return {"message": f"Deleted {deleted_count} users"}
 
 
-@router.post("/{user_id}/checkin", response_model=UserRead)
+@router.post(
+    "/checkin/bulk",
+    response_model=list[BulkCheckinResult],
+    dependencies=[Depends(rate_limit("checkin_bulk", "30/60"))],
+)
+async def bulk_checkin_users(
+    payload: BulkCheckinRequest,
+    service: UserService = Depends(get_user_service)
+):
+    """
+    Apply many queued check-ins at once, e.g. replayed by offline clients.
+    Each item is a user_id with an optional past `day`; the response holds
+    one outcome per item, in request order.
+    """
+    return await service.bulk_checkin(payload.items)
+
+
+@router.post(
+    "/{user_id}/checkin",
+    response_model=UserRead,
+    dependencies=[Depends(rate_limit("checkin", "5/60", key_param="user_id"))],
+)
 async def checkin_user(
     user_id: int,
     service: UserService = Depends(get_user_service)
@@ -118,6 +243,19 @@ async def checkin_user(
     return await service.checkin(user_id)
 
 
+@router.post("/{user_id}/xp", response_model=UserRead)
+async def add_user_xp(
+    user_id: int,
+    payload: XpIncrement,
+    service: UserService = Depends(get_user_service)
+):
+    """
+    Add (or with a negative delta, remove) XP atomically, without
+    reading the user first.
+    """
+    return await service.add_xp(user_id, payload.delta)
+
+
 @router.post("/sync-redis")
 async def sync_users_to_redis(
     service: UserService = Depends(get_user_service)
@@ -127,3 +265,15 @@ async def sync_users_to_redis(
     """
     count = await service.sync_all_users_to_redis()
     return {"message": f"{count} users synced to Redis"}
+
+
+@router.post("/reconcile-redis")
+async def reconcile_users_with_redis(
+    full: bool = False,
+    service: UserService = Depends(get_user_service)
+):
+    """
+    Repair leaderboard entries that drifted from the database.
+    Only users changed since the previous run are scanned unless `full` is set.
+    """
+    return await service.reconcile_redis(full)
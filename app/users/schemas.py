@@ -1,6 +1,11 @@
+import os
+from typing import Literal
+
 from pydantic import BaseModel, ConfigDict, Field
 from datetime import date
 
+BULK_CHECKIN_MAX_ITEMS = int(os.getenv("BULK_CHECKIN_MAX_ITEMS", "1000"))
+
 
 class UserCreate(BaseModel):
     username: str
@@ -17,6 +22,7 @@ class UserRead(BaseModel):
     frozen_days: int
     last_checkin: date | None
     last_streak_reset: date | None
+    version: int
 
     model_config = ConfigDict(from_attributes=True)
     
@@ -34,12 +40,56 @@ class UserUpdate(BaseModel):
     streak: int | None = None
     frozen_days: int | None = None
     last_checkin: date | None = None
+    # reject the update with 409 unless the user is still at this version
+    expected_version: int | None = None
+
+
+class XpIncrement(BaseModel):
+    delta: int
 
 
 class UserLookup(BaseModel):
     username: str
 
 
-class UserPasswordUpdate(BaseModel):
-    old_password: str
-    new_password: str
+class UserLogin(BaseModel):
+    username: str
+    password: str
+
+
+class CheckinRead(BaseModel):
+    day: date
+    xp: int
+    streak: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class DailyCheckinCount(BaseModel):
+    day: date
+    checkins: int
+
+
+class BulkCheckinItem(BaseModel):
+    user_id: int
+    day: date | None = None  # defaults to today
+
+
+class BulkCheckinRequest(BaseModel):
+    items: list[BulkCheckinItem] = Field(min_length=1, max_length=BULK_CHECKIN_MAX_ITEMS)
+
+
+class BulkCheckinResult(BaseModel):
+    user_id: int
+    day: date
+    status: Literal[
+        "checked_in",
+        "already_checked_in",
+        "out_of_order",
+        "invalid_date",
+        "too_old",
+        "not_found",
+        "conflict",
+    ]
+    xp: int | None = None
+    streak: int | None = None
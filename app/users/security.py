@@ -0,0 +1,111 @@
+"""
+Password hashing with scrypt, kept off the event loop.
+
+Hashes are stored as `scrypt$<n>$<r>$<p>$<salt>$<hash>` (base64 parts), so
+cost parameters can be raised later: `needs_rehash` flags hashes made with
+other parameters, and rows still holding a legacy plaintext password.
+
+hashlib.scrypt releases the GIL, so a small thread pool gives real
+parallelism; PASSWORD_HASH_EXECUTOR=process switches to a process pool.
+At most PASSWORD_HASH_MAX_PENDING hashes wait for the pool at once, so a
+signup burst queues on a semaphore instead of piling up work.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+PASSWORD_SCRYPT_N = int(os.getenv("PASSWORD_SCRYPT_N", str(2 ** 14)))
+PASSWORD_SCRYPT_R = int(os.getenv("PASSWORD_SCRYPT_R", "8"))
+PASSWORD_SCRYPT_P = int(os.getenv("PASSWORD_SCRYPT_P", "1"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+
+SCHEME = "scrypt"
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.b64encode(raw).decode("ascii")
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode(),
+        salt=salt,
+        n=n,
+        r=r,
+        p=p,
+        dklen=KEY_BYTES,
+        maxmem=256 * n * r,  # room for scrypt's 128 * n * r working set
+    )
+
+
+def hash_password(password: str, n: int, r: int, p: int) -> str:
+    salt = os.urandom(SALT_BYTES)
+    key = _scrypt(password, salt, n, r, p)
+    return f"{SCHEME}${n}${r}${p}${_b64encode(salt)}${_b64encode(key)}"
+
+
+def verify_password(password: str, encoded: str) -> bool:
+    if not encoded.startswith(f"{SCHEME}$"):
+        # legacy row stored before hashing existed
+        return hmac.compare_digest(password.encode(), encoded.encode())
+    _scheme, n, r, p, salt, key = encoded.split("$")
+    candidate = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+    return hmac.compare_digest(candidate, base64.b64decode(key))
+
+
+class PasswordHasher:
+    def __init__(
+        self,
+        n: int = PASSWORD_SCRYPT_N,
+        r: int = PASSWORD_SCRYPT_R,
+        p: int = PASSWORD_SCRYPT_P,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_pending: int = PASSWORD_HASH_MAX_PENDING,
+        executor: str = PASSWORD_HASH_EXECUTOR,
+    ):
+        self.n, self.r, self.p = n, r, p
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor_kind = executor
+        self._executor: Executor | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_pending)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password, self.n, self.r, self.p)
+
+    async def verify(self, password: str, encoded: str) -> bool:
+        return await self._run(verify_password, password, encoded)
+
+    def needs_rehash(self, encoded: str) -> bool:
+        return not encoded.startswith(f"{SCHEME}${self.n}${self.r}${self.p}$")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._semaphore = None
+
+
+password_hasher = PasswordHasher()
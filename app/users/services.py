@@ -1,14 +1,108 @@
-from datetime import date
+import asyncio
+import os
+from datetime import date, timedelta
 
 
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.exc import StaleDataError
 from fastapi import HTTPException
 
 
 from .models import User
-from .schemas import UserCreate, UserUpdate
-from .repositories import UserRepository
-from app.users.events import publish_leaderboard_event, clear_leaderboard
+from .schemas import BulkCheckinItem, BulkCheckinResult, UserCreate, UserUpdate
+from .repositories import CheckinRepository, UserRepository
+from .security import password_hasher
+from app import metrics
+from app.users.cache import (
+    cache_username,
+    clear_checked_in,
+    clear_username_cache,
+    count_checked_in,
+    forget_username,
+    get_cached_user_id,
+    has_checked_in,
+    mark_checked_in_many,
+    set_checked_in,
+)
+from app.users.events import (
+    build_leaderboard_event,
+    build_tombstone_event,
+    find_orphaned_members,
+    publish_leaderboard_event,
+    publish_leaderboard_events,
+    reset_leaderboard,
+)
+
+
+CHECKIN_XP = 10
+BULK_CHECKIN_CHUNK_SIZE = int(os.getenv("BULK_CHECKIN_CHUNK_SIZE", "500"))
+BULK_CHECKIN_RETRIES = int(os.getenv("BULK_CHECKIN_RETRIES", "3"))
+# how far back a queued offline check-in may be dated (0 = today only)
+BULK_CHECKIN_MAX_BACKDATE_DAYS = int(os.getenv("BULK_CHECKIN_MAX_BACKDATE_DAYS", "7"))
+# optimistic-concurrency retries for single-user writes (check-in, PATCH)
+USER_UPDATE_RETRIES = int(os.getenv("USER_UPDATE_RETRIES", "3"))
+# months of check-in partitions kept ahead, this month included
+CHECKIN_PARTITION_MONTHS = int(os.getenv("CHECKIN_PARTITION_MONTHS", "3"))
+ALLOW_TRUNCATE = os.getenv("ALLOW_TRUNCATE", "false").lower() == "true"
+
+
+def apply_checkin(user, day: date):
+    """
+    Apply the check-in rules for `day` to `user` (a User or any object with
+    the same attributes): streaks, frozen days, max streak, XP, last_checkin.
+    """
+    if not user.last_checkin:
+        # First ever check-in
+        user.streak = 1
+    else:
+        delta = (day - user.last_checkin).days
+        if delta == 1:
+            # Consecutive day
+            user.streak += 1
+        elif delta > 1:
+            missed_days = delta - 1
+            if user.frozen_days >= missed_days:
+                # Use frozen days to maintain streak
+                user.frozen_days -= missed_days
+                user.streak += 1
+            else:
+                # Not enough frozen days → reset streak
+                user.streak = 1
+                user.frozen_days = 0
+                user.last_streak_reset = day
+
+    # Update max streak
+    if user.streak > user.max_streak:
+        user.max_streak = user.streak
+
+    # Add XP
+    user.xp += CHECKIN_XP
+
+    # Update last_checkin date
+    user.last_checkin = day
+
+
+# strong references to in-flight background rehashes
+_background_tasks: set[asyncio.Task] = set()
+
+
+async def rehash_password(session_factory: sessionmaker, user_id: int, password: str, old_password_hash: str):
+    """
+    Upgrade a user's stored hash to the current parameters, in its own
+    session. Skipped if the password changed since it was verified.
+    """
+    password_hash = await password_hasher.hash(password)
+    try:
+        async with session_factory() as session:
+            updated = await UserRepository(session).set_password(user_id, password_hash, old_password_hash)
+    except SQLAlchemyError as exc:
+        # nobody awaits this task; the next login retries the upgrade
+        metrics.incr("password.rehash_errors")
+        print(f"⚠️ Could not rehash the password of user {user_id}: {exc}")
+        return
+    metrics.incr("password.rehashed" if updated else "password.rehash_skipped")
 
 
 class UserService:
@@ -17,8 +111,11 @@ class UserService:
     Encapsulates business logic and delegates persistence to UserRepository.
     """
 
-    def __init__(self, repo: UserRepository):
+    def __init__(self, repo: UserRepository, session_factory: sessionmaker | None = None):
         self.repo = repo
+        self.checkins = CheckinRepository(repo.db)
+        # for background work that must not use the request's session
+        self.session_factory = session_factory
 
     @classmethod
     def with_session(cls, db: AsyncSession) -> "UserService":
@@ -31,16 +128,22 @@ class UserService:
     async def register_user(self, payload: UserCreate) -> User:
         """
         Create a new user.
-        Business rules (e.g., password hashing, uniqueness checks) can be added here.
+        Uniqueness is enforced by the database: a duplicate username fails
+        the insert instead of costing a SELECT on every registration.
+        The password is hashed in the worker pool, off the event loop.
         """
-        # check if username exists
-        existing = await self.repo.get_by_username(payload.username)
-        if existing:
+        payload = payload.model_copy(
+            update={"password": await password_hasher.hash(payload.password)}
+        )
+        try:
+            user = await self.repo.create(payload)
+        except IntegrityError:
+            await self.repo.db.rollback()
             raise HTTPException(
                 status_code=400,
                 detail="Username already exists"
             )
-        user = await self.repo.create(payload)
+        await cache_username(user.username, user.id)
 
         # publish leaderboard event
         await publish_leaderboard_event(
@@ -48,6 +151,7 @@ class UserService:
             user_id=user.id,
             xp=user.xp,
             streak=user.streak,
+            version=user.version,
         )
 
         return user
@@ -60,104 +164,392 @@ class UserService:
 
     async def find_user_by_username(self, username: str) -> User | None:
         """
-        Retrieve a user by their username.
+        Retrieve a user by username, case-insensitively (an exact match wins).
+        Exact usernames are cached in Redis (usernames differing only in case
+        are distinct users), so hits are a primary key lookup.
+        """
+        user = await self._get_cached_user(username)
+        if user:
+            return user
+        user = await self.repo.get_by_username_ci(username)
+        if user and user.username == username:
+            await cache_username(username, user.id)
+        return user
+
+    async def find_user_by_exact_username(self, username: str) -> User | None:
+        """
+        Retrieve a user whose username is exactly `username` (for logins,
+        where a case variant must never match another account).
+        """
+        user = await self._get_cached_user(username)
+        if user:
+            return user
+        user = await self.repo.get_by_username(username)
+        if user:
+            await cache_username(username, user.id)
+        return user
+
+    async def _get_cached_user(self, username: str) -> User | None:
+        """The user cached under exactly `username`; a stale entry is dropped."""
+        user_id = await get_cached_user_id(username)
+        if user_id is None:
+            return None
+        user = await self.repo.get_by_id(user_id)
+        if user and user.username == username:
+            return user
+        await forget_username(username)
+        return None
+
+    async def authenticate(self, username: str, password: str) -> User:
+        """
+        Verify credentials (off the event loop) against the account with
+        exactly this username. Hashes made with outdated parameters, or legacy
+        plaintext rows, are upgraded in the background when the service has a
+        session factory.
         """
-        return await self.repo.get_by_username(username)
+        user = await self.find_user_by_exact_username(username)
+        if not user or not await password_hasher.verify(password, user.password):
+            raise HTTPException(status_code=401, detail="Invalid username or password")
+        if self.session_factory is not None and password_hasher.needs_rehash(user.password):
+            task = asyncio.create_task(
+                rehash_password(self.session_factory, user.id, password, user.password)
+            )
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+        return user
 
     async def update_user(self, user: User, payload: UserUpdate) -> User:
         """
         Update user fields with provided payload.
+        Writes are version-checked instead of locking the row. With
+        `expected_version` a concurrent change is a 409; without it the
+        fields are re-applied to the fresh row, up to USER_UPDATE_RETRIES times.
+        """
+        if payload.password is not None:
+            payload = payload.model_copy(
+                update={"password": await password_hasher.hash(payload.password)}
+            )
+        user_id = user.id
+        for _attempt in range(USER_UPDATE_RETRIES):
+            if payload.expected_version is not None and user.version != payload.expected_version:
+                raise HTTPException(status_code=409, detail="User was modified by another request")
+            try:
+                user = await self.repo.update(user, payload)
+                break
+            except StaleDataError:
+                await self.repo.db.rollback()
+                metrics.incr("user_update.retries")
+                user = await self.repo.get_by_id(user_id, fresh=True)
+                if not user:
+                    raise HTTPException(status_code=404, detail="User not found")
+        else:
+            raise HTTPException(status_code=409, detail="User was modified by another request")
+
+        if "last_checkin" in payload.model_fields_set:
+            # keep today's check-in bitmap in line with an admin override
+            await set_checked_in(user.id, date.today(), user.last_checkin == date.today())
+        if "xp" in payload.model_fields_set:
+            await publish_leaderboard_event(
+                event_type="update",
+                user_id=user.id,
+                xp=user.xp,
+                streak=user.streak,
+                version=user.version,
+            )
+        return user
+
+    async def add_xp(self, user_id: int, delta: int) -> User:
+        """
+        Add `delta` XP atomically in the database, so concurrent grants
+        never overwrite each other, and publish the new total.
         """
-        return await self.repo.update(user, payload)
+        user = await self.repo.increment_xp(user_id, delta)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        await publish_leaderboard_event(
+            event_type="xp",
+            user_id=user.id,
+            xp=user.xp,
+            streak=user.streak,
+            version=user.version,
+        )
+        return user
 
     async def delete_user(self, user: User) -> User:
         """
-        Delete a user from the database.
+        Delete a user from the database and publish its leaderboard tombstone.
         """
-        return await self.repo.delete(user)
+        user_id, version = user.id, user.version
+        user = await self.repo.delete(user)
+        await forget_username(user.username)
+        # one past the last version, so every earlier event is stale
+        await publish_leaderboard_events([build_tombstone_event(user_id, version + 1)])
+        return user
     
-    async def delete_all_users(self) -> int:
+    async def delete_all_users(self, truncate: bool = False) -> int:
         """
         Delete all users from the repository.
-        Returns the number of deleted rows.
+        Rows go in id-ordered chunks, each followed by one pipeline of
+        leaderboard tombstones for those users. `truncate` (only when
+        ALLOW_TRUNCATE is set, e.g. in tests) empties the table in one
+        statement instead. Returns the number of deleted rows.
         """
-        return await self.repo.delete_all()
+        if truncate:
+            if not ALLOW_TRUNCATE:
+                raise HTTPException(status_code=403, detail="Truncate is disabled")
+            deleted = await self.repo.truncate()
+            # ids restart from 1, so nothing keyed by user id may survive
+            await reset_leaderboard()
+            await clear_checked_in([date.today() - timedelta(days=1), date.today()])
+        else:
+            deleted = 0
+            async for deleted_rows in self.repo.delete_in_chunks():
+                deleted += len(deleted_rows)
+                await publish_leaderboard_events([
+                    build_tombstone_event(row.id, row.version + 1) for row in deleted_rows
+                ])
+        await clear_username_cache()
+        return deleted
 
     
     async def sync_all_users_to_redis(self) -> int:
         """
-        Publish all users to Redis for leaderboard sync.
-        Returns the number of users synced.
+        Publish all users to Redis for leaderboard sync, plus tombstones for
+        leaderboard members that no longer exist. Nothing is cleared: the
+        projected versions stay, so stale events still in the stream cannot
+        come back. (Drift at an already-projected version is the
+        reconciler's job.) Returns the number of users synced.
         """
-        await clear_leaderboard()
-        users = await self.repo.list_all()  # implement list_all in UserRepository
-        for user in users:
-            await publish_leaderboard_event(
+        users = await self.repo.list_all()
+        orphans = await find_orphaned_members({user.id for user in users})
+        await publish_leaderboard_events([
+            build_leaderboard_event(
                 event_type="sync_user",
                 user_id=user.id,
                 xp=user.xp,
                 streak=user.streak,
+                version=user.version,
             )
+            for user in users
+        ] + [
+            build_tombstone_event(member, version + 1) for member, version in orphans.items()
+        ])
         return len(users)
 
+    async def count_active_users(self, day: date) -> int:
+        """
+        Number of users who checked in on `day`, from the check-in bitmap.
+        Only days still within the bitmap TTL are available.
+        """
+        return await count_checked_in(day)
+
+    async def checkin_calendar(self, user_id: int, start: date, end: date) -> list:
+        """
+        A user's check-ins between start and end (inclusive).
+        """
+        return await self.checkins.calendar(user_id, start, end)
+
+    async def daily_checkin_counts(self, start: date, end: date) -> list[dict]:
+        """
+        Check-ins per day between start and end (inclusive), served from
+        the daily rollups where available.
+        """
+        counts = await self.checkins.daily_counts(start, end)
+        return [{"day": day, "checkins": count} for day, count in counts]
+
+    async def refresh_checkin_rollups(self, start: date, end: date) -> dict:
+        """
+        Make sure the check-in partitions for the next CHECKIN_PARTITION_MONTHS
+        months exist and recompute daily rollups for the range. Run by the
+        maintenance task; a partition that cannot be created is counted and
+        reported but does not block the rollups.
+        """
+        try:
+            partitions = await self.checkins.ensure_partitions(date.today(), months=CHECKIN_PARTITION_MONTHS)
+            partition_error = None
+        except SQLAlchemyError as exc:
+            await self.repo.db.rollback()
+            metrics.incr("checkins.partition_errors")
+            print(f"⚠️ Could not create check-in partitions: {exc}")
+            partitions, partition_error = [], type(exc).__name__
+        days = await self.checkins.refresh_rollups(start, end)
+        return {"days": days, "partitions": partitions, "partition_error": partition_error}
+
+    async def reconcile_redis(self, full: bool = False) -> dict:
+        """
+        Repair leaderboard drift for users changed since the last run,
+        without wiping the leaderboard.
+        """
+        from app.leaderboard.reconciler import reconcile_leaderboard
+
+        return await reconcile_leaderboard(self.repo, full)
+
     async def checkin(self, user_id: int) -> User:
         """
         Daily check-in logic:
         - Updates streaks, XP, and frozen days.
         - Publishes event to Redis.
         """
-        user = await self.repo.get_by_id(user_id)
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-
         today = date.today()
 
-        # Already checked in today
-        if user.last_checkin == today:
+        # Repeat check-ins are answered from the daily bitmap, without a DB read
+        if await has_checked_in(user_id, today):
+            metrics.incr("checkin.rejected_from_bitmap")
             raise HTTPException(
                 status_code=400, detail="Already checked in today")
 
-        if not user.last_checkin:
-            # First ever check-in
-            user.streak = 1
-        else:
-            delta = (today - user.last_checkin).days
-            if delta == 1:
-                # Consecutive day
-                user.streak += 1
-            elif delta > 1:
-                missed_days = delta - 1
-                if user.frozen_days >= missed_days:
-                    # Use frozen days to maintain streak
-                    user.frozen_days -= missed_days
-                    user.streak += 1
-                else:
-                    # Not enough frozen days → reset streak
-                    user.streak = 1
-                    user.frozen_days = 0
-                    user.last_streak_reset = today
+        # A concurrent write to the same user (another device, an admin
+        # PATCH) fails the version check; read the new state and apply again.
+        for _attempt in range(USER_UPDATE_RETRIES):
+            state = (await self.repo.get_checkin_states([user_id])).get(user_id)
+            if state is None:
+                raise HTTPException(status_code=404, detail="User not found")
 
-        # Update max streak
-        if user.streak > user.max_streak:
-            user.max_streak = user.streak
+            # Already checked in today
+            if state.last_checkin == today:
+                await set_checked_in(user_id, today)
+                raise HTTPException(
+                    status_code=400, detail="Already checked in today")
 
-        # Add XP
-        user.xp += 10
+            apply_checkin(state, today)
 
-        # Update last_checkin date
-        user.last_checkin = today
-
-        # Save changes using repository
-        self.repo.db.add(user)
-        await self.repo.db.commit()
-        await self.repo.db.refresh(user)
+            # Save changes and the history row in one transaction
+            user = await self.repo.save_checkin(state)
+            if user is None:
+                await self.repo.db.rollback()
+                metrics.incr("checkin.retries")
+                continue
+            await self.checkins.add(user_id, today, state.xp, state.streak)
+            await self.repo.db.commit()
+            break
+        else:
+            raise HTTPException(status_code=409, detail="User was modified by another request")
+        await set_checked_in(user_id, today)
 
         # Publish event to Redis
         await publish_leaderboard_event(
             event_type="checkin",
             user_id=user.id,
             xp=user.xp,
-            streak=user.streak
+            streak=user.streak,
+            version=user.version,
         )
 
         return user
+
+    async def bulk_checkin(self, items: list[BulkCheckinItem]) -> list[BulkCheckinResult]:
+        """
+        Apply many check-ins (e.g. replayed by offline clients) in bulk.
+        Items default to today; a user's items are applied oldest first.
+        Items dated in the future are `invalid_date`, and items older than
+        BULK_CHECKIN_MAX_BACKDATE_DAYS are `too_old`: this replays queued
+        check-ins, it does not let clients write arbitrary history.
+        Each chunk of users is read with one SELECT and written with one
+        set-based, versioned UPDATE plus one history insert; a chunk that hits a
+        concurrent write is retried from fresh state. All leaderboard events
+        go out in one pipeline. Returns one outcome per item, in input order.
+        """
+        today = date.today()
+        oldest = today - timedelta(days=BULK_CHECKIN_MAX_BACKDATE_DAYS)
+        results: list[BulkCheckinResult | None] = [None] * len(items)
+        by_user: dict[int, list[tuple[int, date]]] = {}
+        for index, item in enumerate(items):
+            day = item.day or today
+            if day > today:
+                results[index] = BulkCheckinResult(user_id=item.user_id, day=day, status="invalid_date")
+                continue
+            if day < oldest:
+                results[index] = BulkCheckinResult(user_id=item.user_id, day=day, status="too_old")
+                continue
+            by_user.setdefault(item.user_id, []).append((index, day))
+
+        events, checked_in_today = [], []
+        user_ids = list(by_user)
+        for start in range(0, len(user_ids), BULK_CHECKIN_CHUNK_SIZE):
+            chunk = user_ids[start:start + BULK_CHECKIN_CHUNK_SIZE]
+            for _attempt in range(BULK_CHECKIN_RETRIES):
+                try:
+                    chunk_results, chunk_events = await self._bulk_checkin_chunk(chunk, by_user)
+                    break
+                except StaleDataError:
+                    await self.repo.db.rollback()
+                    metrics.incr("bulk_checkin.retries")
+            else:
+                chunk_results = {
+                    index: BulkCheckinResult(user_id=user_id, day=day, status="conflict")
+                    for user_id in chunk
+                    for index, day in by_user[user_id]
+                }
+                chunk_events = []
+            for index, result in chunk_results.items():
+                results[index] = result
+                if result.status == "checked_in" and result.day == today:
+                    checked_in_today.append(result.user_id)
+            events.extend(chunk_events)
+
+        await mark_checked_in_many(checked_in_today, today)
+        await publish_leaderboard_events(events)
+        metrics.incr("bulk_checkin.items", len(items))
+        return results
+
+    async def _bulk_checkin_chunk(
+        self,
+        user_ids: list[int],
+        by_user: dict[int, list[tuple[int, date]]]
+    ) -> tuple[dict[int, BulkCheckinResult], list[dict]]:
+        states = await self.repo.get_checkin_states(user_ids)
+        results: dict[int, BulkCheckinResult] = {}
+        updates, history, events = [], [], []
+
+        for user_id in user_ids:
+            state = states.get(user_id)
+            applied = False
+            for index, day in sorted(by_user[user_id], key=lambda entry: entry[1]):
+                if state is None:
+                    status = "not_found"
+                elif state.last_checkin == day:
+                    status = "already_checked_in"
+                elif state.last_checkin and day < state.last_checkin:
+                    status = "out_of_order"
+                else:
+                    apply_checkin(state, day)
+                    history.append({"user_id": user_id, "day": day, "xp": state.xp, "streak": state.streak})
+                    applied = True
+                    status = "checked_in"
+                results[index] = BulkCheckinResult(
+                    user_id=user_id,
+                    day=day,
+                    status=status,
+                    xp=state.xp if state else None,
+                    streak=state.streak if state else None,
+                )
+            if applied:
+                updates.append({
+                    "id": user_id,
+                    "xp": state.xp,
+                    "streak": state.streak,
+                    "max_streak": state.max_streak,
+                    "frozen_days": state.frozen_days,
+                    "last_checkin": state.last_checkin,
+                    "last_streak_reset": state.last_streak_reset,
+                    # matched against the row, then bumped by the UPDATE
+                    "version": state.version,
+                })
+                events.append(build_leaderboard_event(
+                    event_type="checkin",
+                    user_id=user_id,
+                    xp=state.xp,
+                    streak=state.streak,
+                    version=state.version + 1,
+                ))
+
+        if updates:
+            updated = await self.repo.bulk_update(updates)
+            if len(updated) != len(updates):
+                # some user changed since it was read: retry the whole chunk
+                raise StaleDataError("users changed during bulk check-in")
+            await self.checkins.add_many(history)
+            # backdated check-ins make those days' rollups stale
+            await self.checkins.invalidate_rollups({row["day"] for row in history if row["day"] < date.today()})
+            await self.repo.db.commit()
+        return results, events
@@ -0,0 +1,15 @@
+import os
+
+from uvicorn_worker import UvicornWorker as BaseUvicornWorker
+
+
+class UvicornWorker(BaseUvicornWorker):
+    """
+    Uvicorn worker for gunicorn with a configurable event loop and HTTP parser.
+    UVICORN_LOOP: auto | asyncio | uvloop, UVICORN_HTTP: auto | h11 | httptools.
+    """
+    CONFIG_KWARGS = {
+        "loop": os.getenv("UVICORN_LOOP", "auto"),
+        "http": os.getenv("UVICORN_HTTP", "auto"),
+        "lifespan": "on",
+    }
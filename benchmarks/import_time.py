@@ -0,0 +1,68 @@
+"""
+Startup cost benchmark: how long `import app.main` takes.
+
+Runs `python -X importtime -c "import app.main"` in fresh interpreters,
+reports the median total and the heaviest modules, and exits non-zero when
+the median exceeds the budget, so CI catches startup regressions.
+
+    python benchmarks/import_time.py --runs 5 --budget-ms 1500
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module: str) -> dict[str, tuple[int, int]]:
+    """Return {module: (self_us, cumulative_us)} for one cold import."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time of the app")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=float(os.getenv("IMPORT_TIME_BUDGET_MS", "0")),
+        help="fail when the median exceeds this (0 = report only)",
+    )
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    totals_ms = [run[args.module][1] / 1000 for run in runs]
+    median_ms = statistics.median(totals_ms)
+
+    # heaviest modules by self time, from the median run
+    median_run = sorted(runs, key=lambda run: run[args.module][1])[len(runs) // 2]
+    heaviest = sorted(median_run.items(), key=lambda item: item[1][0], reverse=True)
+    print(f"{'self ms':>9} {'cumul ms':>9}  module")
+    for name, (self_us, cumulative_us) in heaviest[:args.top]:
+        print(f"{self_us / 1000:>9.1f} {cumulative_us / 1000:>9.1f}  {name}")
+    print(f"\nimport {args.module}: median {median_ms:.0f} ms over {args.runs} run(s)")
+
+    if args.budget_ms and median_ms > args.budget_ms:
+        print(f"❌ over budget ({args.budget_ms:.0f} ms)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Event-loop lag during a signup burst: inline scrypt vs the hashing pool.
+
+A ticker task sleeps 1ms in a loop and records how late each wake-up is,
+while `--signups` concurrent hashes run either directly on the loop or
+through app.users.security.PasswordHasher. Reports throughput and lag.
+
+    python benchmarks/password_hashing.py --signups 200 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.users.security import (  # noqa: E402
+    PASSWORD_SCRYPT_N,
+    PASSWORD_SCRYPT_P,
+    PASSWORD_SCRYPT_R,
+    PasswordHasher,
+    hash_password,
+)
+
+TICK = 0.001
+
+
+async def _ticker(lags: list[float], stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - started - TICK)
+
+
+async def _burst(signups: int, hash_one) -> tuple[float, list[float]]:
+    lags: list[float] = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_ticker(lags, stop))
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    await asyncio.gather(*(hash_one(f"password-{i}") for i in range(signups)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+    return elapsed, lags
+
+
+async def run(signups: int, workers: int, executor: str):
+    async def inline(password):
+        return hash_password(password, PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P)
+
+    hasher = PasswordHasher(workers=workers, executor=executor)
+    try:
+        modes = {"inline": inline, f"{executor} pool x{workers}": hasher.hash}
+        print(f"{'mode':<20} {'hash/s':>8} {'lag p50 ms':>11} {'lag p99 ms':>11} {'lag max ms':>11}")
+        for name, hash_one in modes.items():
+            elapsed, lags = await _burst(signups, hash_one)
+            lags = sorted(lags) or [0.0]
+            p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))]
+            print(
+                f"{name:<20} {signups / elapsed:>8.1f} {statistics.median(lags) * 1000:>11.2f} "
+                f"{p99 * 1000:>11.2f} {lags[-1] * 1000:>11.2f}"
+            )
+    finally:
+        hasher.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure event-loop lag while hashing passwords")
+    parser.add_argument("--signups", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--executor", choices=("thread", "process"), default="thread")
+    args = parser.parse_args()
+    asyncio.run(run(args.signups, args.workers, args.executor))
+
+
+if __name__ == "__main__":
+    main()
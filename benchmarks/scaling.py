@@ -0,0 +1,120 @@
+"""
+Worker scaling benchmark: requests per second vs gunicorn worker count.
+
+Starts the production server (gunicorn.conf.py) once per worker count and
+drives it with a multi-process httpx load generator, then prints a table.
+
+    python benchmarks/scaling.py --workers 1 2 4 8 --path /leaderboard/
+
+The load generator needs CPU too: run it on a separate machine (--url) or
+make sure the box has cores to spare beyond the largest worker count.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def _drive(url: str, connections: int, duration: float) -> tuple[int, int]:
+    ok = errors = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(limits=limits, timeout=10) as client:
+
+        async def loop():
+            nonlocal ok, errors
+            while time.perf_counter() < deadline:
+                try:
+                    response = await client.get(url)
+                    if response.status_code < 500:
+                        ok += 1
+                    else:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+
+        await asyncio.gather(*(loop() for _ in range(connections)))
+    return ok, errors
+
+
+def _client_process(url, connections, duration, queue):
+    queue.put(asyncio.run(_drive(url, connections, duration)))
+
+
+def run_load(url: str, processes: int, connections: int, duration: float) -> tuple[float, int]:
+    queue = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(target=_client_process, args=(url, connections, duration, queue))
+        for _ in range(processes)
+    ]
+    for proc in procs:
+        proc.start()
+    results = [queue.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    ok = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    return ok / duration, errors
+
+
+def wait_until_up(url: str, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server did not come up at {url}")
+
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "WEB_CONCURRENCY": str(workers),
+        "PORT": str(port),
+        "GUNICORN_ACCESSLOG": "/dev/null",
+        "RATE_LIMIT_ENABLED": "false",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app.main:create_app()", "-c", "gunicorn.conf.py"],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RPS vs gunicorn worker count")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--path", default="/")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--client-procs", type=int, default=2)
+    parser.add_argument("--connections", type=int, default=32, help="per client process")
+    args = parser.parse_args()
+
+    url = f"http://127.0.0.1:{args.port}{args.path}"
+    print(f"{'workers':>8} {'req/s':>10} {'errors':>8}")
+    for workers in args.workers:
+        server = start_server(workers, args.port)
+        try:
+            wait_until_up(f"http://127.0.0.1:{args.port}/")
+            rps, errors = run_load(url, args.client_procs, args.connections, args.duration)
+            print(f"{workers:>8} {rps:>10.0f} {errors:>8}")
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
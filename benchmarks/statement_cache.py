@@ -0,0 +1,181 @@
+"""
+Python-side statement overhead of the hot user queries.
+
+Runs each query against an in-memory SQLite database (so the database
+itself costs almost nothing) in four modes and prints microseconds per
+call:
+
+    uncached   select()/update() built per call, compiled cache disabled
+    built      select()/update() built per call, compiled cache enabled
+    lambda     lambda_stmt() per call
+    prebuilt   the repository's module-level statements with bind
+               parameters (app.users.repositories), as the app runs them
+
+    python benchmarks/statement_cache.py --calls 20000
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, func, lambda_stmt, select, update
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import Base  # noqa: E402
+from app.users.models import User  # noqa: E402
+from app.users.repositories import (  # noqa: E402
+    SAVE_CHECKIN,
+    USER_BY_ID,
+    USER_BY_USERNAME_CI,
+    save_checkin_params,
+)
+
+USERS = 1000
+
+
+def plain_by_id(user_id):
+    return select(User).where(User.id == user_id)
+
+
+def plain_by_username_ci(username):
+    return (
+        select(User)
+        .where(func.lower(User.username) == username.lower())
+        .order_by((User.username == username).desc(), User.id)
+        .limit(1)
+    )
+
+
+def plain_save_checkin(state):
+    return (
+        update(User)
+        .where(User.id == state.id, User.version == state.version)
+        .values(
+            xp=state.xp,
+            streak=state.streak,
+            max_streak=state.max_streak,
+            frozen_days=state.frozen_days,
+            last_checkin=state.last_checkin,
+            last_streak_reset=state.last_streak_reset,
+            version=state.version + 1,
+        )
+        .returning(User)
+    )
+
+
+def lambda_by_id(user_id):
+    return lambda_stmt(lambda: select(User).where(User.id == user_id))
+
+
+def lambda_by_username_ci(username):
+    lowered = username.lower()
+    return lambda_stmt(
+        lambda: select(User)
+        .where(func.lower(User.username) == lowered)
+        .order_by((User.username == username).desc(), User.id)
+        .limit(1)
+    )
+
+
+def lambda_save_checkin(state):
+    user_id, version, new_version, xp = state.id, state.version, state.version + 1, state.xp
+    streak, max_streak, frozen_days = state.streak, state.max_streak, state.frozen_days
+    last_checkin, last_streak_reset = state.last_checkin, state.last_streak_reset
+    return lambda_stmt(
+        lambda: update(User)
+        .where(User.id == user_id, User.version == version)
+        .values(
+            xp=xp,
+            streak=streak,
+            max_streak=max_streak,
+            frozen_days=frozen_days,
+            last_checkin=last_checkin,
+            last_streak_reset=last_streak_reset,
+            version=new_version,
+        )
+        .returning(User)
+    )
+
+
+def checkin_state(i):
+    # version never matches, so the UPDATE runs but changes nothing
+    return SimpleNamespace(
+        id=i, version=-1, xp=i, streak=1, max_streak=1, frozen_days=0,
+        last_checkin=date.today(), last_streak_reset=None,
+    )
+
+
+def by_id_arg(i):
+    return i % USERS + 1
+
+
+def username_arg(i):
+    return f"User{i % USERS}"
+
+
+def state_arg(i):
+    return checkin_state(i % USERS + 1)
+
+
+# name -> (argument for call i, per-call builder, lambda builder, prebuilt statement, its params)
+QUERIES = {
+    "get_by_id": (
+        by_id_arg, plain_by_id, lambda_by_id, USER_BY_ID, lambda user_id: {"user_id": user_id},
+    ),
+    "get_by_username": (
+        username_arg, plain_by_username_ci, lambda_by_username_ci, USER_BY_USERNAME_CI,
+        lambda username: {"lowered": username.lower(), "username": username},
+    ),
+    "checkin update": (
+        state_arg, plain_save_checkin, lambda_save_checkin, SAVE_CHECKIN, save_checkin_params,
+    ),
+}
+
+
+def make_engine(query_cache_size: int):
+    engine = create_engine("sqlite://", query_cache_size=query_cache_size)
+    Base.metadata.create_all(engine, tables=[User.__table__])
+    with Session(engine) as session:
+        session.add_all(User(username=f"user{i}", password="x") for i in range(USERS))
+        session.commit()
+    return engine
+
+
+def time_calls(engine, execute, arg, calls: int) -> float:
+    with Session(engine) as session:
+        for i in range(100):  # warm the caches
+            execute(session, arg(i)).all()
+            session.expunge_all()
+        started = time.perf_counter()
+        for i in range(calls):
+            execute(session, arg(i)).all()
+            session.expunge_all()
+        elapsed = time.perf_counter() - started
+        session.rollback()
+    return elapsed / calls * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure statement build/compile overhead")
+    parser.add_argument("--calls", type=int, default=10000)
+    args = parser.parse_args()
+
+    uncached, cached = make_engine(0), make_engine(500)
+    modes = ("uncached", "built", "lambda", "prebuilt")
+    print(f"{'query (us/call)':<16} " + " ".join(f"{mode:>9}" for mode in modes))
+    for name, (arg, plain, lambda_builder, prebuilt, params) in QUERIES.items():
+        timings = (
+            time_calls(uncached, lambda s, a: s.execute(plain(a)), arg, args.calls),
+            time_calls(cached, lambda s, a: s.execute(plain(a)), arg, args.calls),
+            time_calls(cached, lambda s, a: s.execute(lambda_builder(a)), arg, args.calls),
+            time_calls(cached, lambda s, a: s.execute(prebuilt, params(a)), arg, args.calls),
+        )
+        print(f"{name:<16} " + " ".join(f"{t:>9.1f}" for t in timings))
+
+
+if __name__ == "__main__":
+    main()
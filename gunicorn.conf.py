@@ -0,0 +1,25 @@
+"""
+Production server settings: gunicorn managing uvicorn worker processes.
+
+    gunicorn 'app.main:create_app()' -c gunicorn.conf.py
+
+Every worker imports the app itself (no preload), so each process builds
+its own database and Redis pools in the app lifespan instead of sharing
+sockets inherited from the master.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "app.workers.UvicornWorker"
+preload_app = False
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# recycle workers now and then to cap slow memory growth
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "1000"))
+
+accesslog = os.getenv("GUNICORN_ACCESSLOG", "-")
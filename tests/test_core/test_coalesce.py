@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+from app.coalesce import RequestCoalescer
+
+
+@pytest.mark.anyio
+async def test_concurrent_calls_share_one_backend_call():
+    coalescer = RequestCoalescer("test")
+    calls = 0
+
+    async def backend():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"value": 1}
+
+    results = await asyncio.gather(*(coalescer.run("key", backend) for _ in range(10)))
+
+    assert calls == 1
+    assert all(result == {"value": 1} for result in results)
+
+
+@pytest.mark.anyio
+async def test_errors_reach_every_waiter_and_are_not_cached():
+    coalescer = RequestCoalescer("test")
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(
+        *(coalescer.run("key", failing) for _ in range(3)), return_exceptions=True
+    )
+    assert all(isinstance(result, ValueError) for result in results)
+
+    async def ok():
+        return "ok"
+
+    assert await coalescer.run("key", ok) == "ok"
@@ -0,0 +1,14 @@
+import pytest
+from app import metrics
+
+
+@pytest.mark.anyio
+async def test_flush_moves_counters_to_shared_hash(redis_client):
+    metrics.reset()
+    metrics.incr("test.calls", 3)
+    assert await metrics.flush(redis_client) == 1
+    assert metrics.snapshot() == {}
+
+    metrics.incr("test.calls")
+    assert (await metrics.aggregate(redis_client))["test.calls"] == 4
+    metrics.reset()
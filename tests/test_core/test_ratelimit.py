@@ -0,0 +1,22 @@
+import pytest
+from app import ratelimit
+from app.ratelimit import SlidingWindowRateLimiter, parse_limit
+
+
+def test_parse_limit():
+    assert parse_limit("5/60") == (5, 60)
+
+
+@pytest.mark.anyio
+async def test_sliding_window_rejects_after_limit(redis_client, monkeypatch):
+    monkeypatch.setattr(ratelimit, "get_redis", lambda: redis_client)
+    limiter = SlidingWindowRateLimiter("test", limit=2, window_seconds=60)
+
+    assert (await limiter.hit("42"))[0] is True
+    assert (await limiter.hit("42"))[0] is True
+    allowed, retry_after = await limiter.hit("42")
+    assert allowed is False
+    assert 0 < retry_after <= 60
+
+    # other callers have their own window
+    assert (await limiter.hit("43"))[0] is True
@@ -0,0 +1,13 @@
+import subprocess
+import sys
+
+
+def test_importing_the_app_does_not_build_pools():
+    code = (
+        "import sys, app.main, app.database, app.redis_client;"
+        "assert app.database._engine is None;"
+        "assert app.redis_client._client is None;"
+        "assert 'asyncpg' not in sys.modules;"
+        "assert 'app.users.routers' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
@@ -0,0 +1,79 @@
+from array import array
+from datetime import date
+
+import pytest
+from app.leaderboard import archive, services
+from app.leaderboard.archive import LeaderboardArchive, archive_for, archive_path, write_archive
+from app.leaderboard.services import LEADERBOARD_KEY, LeaderboardService
+
+
+@pytest.mark.parametrize("use_mmap", [True, False])
+def test_archive_lookups(tmp_path, use_mmap):
+    path = str(tmp_path / "snapshot.lbs")
+    # ascending xp, as ZRANGE returns it
+    write_archive(path, array("q", [5, 10, 10, 40]), array("q", [7, 3, 9, 1]))
+
+    with LeaderboardArchive(path, use_mmap=use_mmap) as snapshot:
+        assert len(snapshot) == 4
+        assert snapshot.lookup(1) == (1, 40)
+        assert snapshot.lookup(7) == (4, 5)
+        assert snapshot.lookup(2) is None
+        assert snapshot.rank_for_xp(40) == 1
+        assert snapshot.rank_for_xp(20) == 2
+        assert snapshot.rank_for_xp(0) == 5
+        assert snapshot.top(2) == [(1, 40), (9, 10)]
+
+
+def test_archive_for_picks_latest_on_or_before(tmp_path):
+    directory = str(tmp_path)
+    for day in (date(2024, 1, 7), date(2024, 1, 14)):
+        write_archive(archive_path(day, directory), array("q"), array("q"))
+
+    assert archive_for(date(2024, 1, 1), directory) is None
+    assert archive_for(date(2024, 1, 10), directory) == archive_path(date(2024, 1, 7), directory)
+    assert archive_for(date(2024, 2, 1), directory) == archive_path(date(2024, 1, 14), directory)
+
+
+@pytest.mark.anyio
+async def test_export_import_and_rank_on(redis_client, tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "LEADERBOARD_ARCHIVE_DIR", str(tmp_path))
+    await redis_client.zadd(LEADERBOARD_KEY, {"1": 30, "2": 20, "3": 10, "orphan": 5})
+    service = LeaderboardService(redis_client)
+    day = date(2024, 3, 4)
+
+    exported = await service.export_snapshot(day)
+    assert exported["users"] == 3
+    assert exported["skipped"] == 1
+
+    ranked = await service.get_user_rank_on(2, date(2024, 3, 10))
+    assert (ranked["rank"], ranked["xp"]) == (2, 20)
+
+    monkeypatch.setattr(services, "LEADERBOARD_ARCHIVE_PAGE_SIZE", 2)
+    await redis_client.zadd("leaderboard:restored", {"stale": 1})
+    imported = await service.import_snapshot(exported["path"], "leaderboard:restored")
+    assert imported == {"key": "leaderboard:restored", "users": 3}
+    assert await redis_client.zrevrange("leaderboard:restored", 0, -1, withscores=True) == [
+        ("1", 30.0), ("2", 20.0), ("3", 10.0),
+    ]
+    assert await redis_client.ttl("leaderboard:restored") == -1
+    assert await redis_client.keys("leaderboard:restored:import:*") == []
+
+
+@pytest.mark.anyio
+async def test_export_pages_a_copy_of_the_leaderboard(redis_client, tmp_path, monkeypatch):
+    monkeypatch.setattr(services, "LEADERBOARD_ARCHIVE_PAGE_SIZE", 1)
+    await redis_client.zadd(LEADERBOARD_KEY, {"1": 10, "2": 20, "3": 30})
+    zrange = redis_client.zrange
+
+    async def zrange_during_checkins(*args, **kwargs):
+        # user 1 overtakes everyone between two pages of the export
+        await redis_client.zadd(LEADERBOARD_KEY, {"1": 40})
+        return await zrange(*args, **kwargs)
+
+    monkeypatch.setattr(redis_client, "zrange", zrange_during_checkins)
+    exported = await LeaderboardService(redis_client).export_snapshot(path=str(tmp_path / "snap.lbs"))
+
+    with LeaderboardArchive(exported["path"]) as snapshot:
+        assert len(snapshot) == 3
+        assert snapshot.top(3) == [(3, 30), (2, 20), (1, 10)]
+    assert await redis_client.keys(f"{LEADERBOARD_KEY}:export:*") == []
@@ -0,0 +1,68 @@
+import pytest
+from app.leaderboard.consumer import (
+    LEADERBOARD_CHECKPOINT_KEY,
+    LeaderboardProjection,
+    compact_events,
+)
+from app.leaderboard.services import LEADERBOARD_KEY
+from app.users.events import LEADERBOARD_STREAM
+
+
+def test_compact_events_keeps_newest_version_per_user():
+    entries = [
+        ("1-0", {"event": "checkin", "user_id": "1", "xp": "10", "version": "2"}),
+        ("2-0", {"event": "checkin", "user_id": "2", "xp": "50", "version": "4"}),
+        ("3-0", {"event": "checkin", "user_id": "1", "xp": "30", "version": "4"}),
+        ("4-0", {"event": "checkin", "user_id": "1", "xp": "20", "version": "3"}),
+    ]
+    assert compact_events(entries) == {"1": (30, 4), "2": (50, 4)}
+
+
+def test_compact_events_turns_deleted_into_a_tombstone():
+    entries = [
+        ("1-0", {"event": "checkin", "user_id": "1", "xp": "10", "version": "2"}),
+        ("2-0", {"event": "deleted", "user_id": "1", "xp": "0", "version": "3"}),
+        ("3-0", {"event": "checkin", "user_id": "1", "xp": "20", "version": "2"}),
+    ]
+    assert compact_events(entries) == {"1": (None, 3)}
+
+
+def test_compact_events_skips_malformed_entries():
+    entries = [
+        ("1-0", {"event": "checkin", "user_id": "1"}),
+        ("2-0", {"event": "checkin", "xp": "5"}),
+    ]
+    assert compact_events(entries) == {}
+
+
+@pytest.mark.anyio
+async def test_consume_once_applies_window_and_checkpoints(redis_client):
+    for version, xp in enumerate((10, 20, 30), start=1):
+        await redis_client.xadd(LEADERBOARD_STREAM, {"user_id": 7, "xp": xp, "version": version})
+    await redis_client.xadd(LEADERBOARD_STREAM, {"user_id": 8, "xp": 5, "version": 1})
+
+    projection = LeaderboardProjection(redis_client)
+    last_id, read, written = await projection.consume_once("0-0")
+
+    assert read == 4
+    assert written == 2
+    assert await redis_client.zscore(LEADERBOARD_KEY, "7") == 30
+    assert await redis_client.zscore(LEADERBOARD_KEY, "8") == 5
+    assert await redis_client.get(LEADERBOARD_CHECKPOINT_KEY) == last_id
+    assert await projection.load_checkpoint() == last_id
+
+
+@pytest.mark.anyio
+async def test_stale_events_are_rejected_and_replay_is_idempotent(redis_client):
+    await redis_client.xadd(LEADERBOARD_STREAM, {"user_id": 7, "xp": 30, "version": 3})
+    await redis_client.xadd(LEADERBOARD_STREAM, {"user_id": 7, "xp": 20, "version": 2})
+
+    projection = LeaderboardProjection(redis_client, checkpoint=False)
+    await projection.replay("0-0")
+    assert await redis_client.zscore(LEADERBOARD_KEY, "7") == 30
+
+    read, written = await projection.replay("0-0")
+    assert read == 2
+    assert written == 0
+    assert await redis_client.zscore(LEADERBOARD_KEY, "7") == 30
+    assert await redis_client.get(LEADERBOARD_CHECKPOINT_KEY) is None
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from app.leaderboard import live
+from app.leaderboard.consumer import LeaderboardProjection
+from app.leaderboard.live import LeaderboardFeed, diff_top
+from app.users.events import publish_leaderboard_event
+from app.leaderboard.services import LEADERBOARD_KEY
+
+
+def test_diff_top_reports_moves_and_removals():
+    previous = {"1": (1, 30), "2": (2, 20), "3": (3, 10)}
+    current = {"2": (1, 40), "1": (2, 30), "4": (3, 15)}
+    assert diff_top(previous, current) == {
+        "changed": [
+            {"user": "2", "rank": 1, "xp": 40},
+            {"user": "1", "rank": 2, "xp": 30},
+            {"user": "4", "rank": 3, "xp": 15},
+        ],
+        "removed": ["3"],
+    }
+    assert diff_top(current, current) is None
+
+
+@pytest.mark.anyio
+async def test_refresh_broadcasts_diffs_once_per_change(redis_client):
+    feed = LeaderboardFeed(top_n=2)
+    subscriber, snapshot = feed.subscribe()
+    assert b'"top":[]' in snapshot
+
+    await redis_client.zadd(LEADERBOARD_KEY, {"1": 10, "2": 20, "3": 5})
+    assert await feed.refresh(redis_client) == {
+        "changed": [{"user": "2", "rank": 1, "xp": 20}, {"user": "1", "rank": 2, "xp": 10}],
+        "removed": [],
+    }
+    assert await feed.refresh(redis_client) is None
+    assert subscriber.queue.qsize() == 1
+    assert subscriber.queue.get_nowait().startswith(b"event: diff\n")
+
+    # a late joiner starts from the feed's current top-N
+    _late, snapshot = feed.subscribe()
+    assert b'{"user":"2","rank":1,"xp":20}' in snapshot
+
+
+@pytest.mark.anyio
+async def test_slow_subscriber_is_dropped():
+    feed = LeaderboardFeed(queue_size=2)
+    slow, _ = feed.subscribe()
+    fast, _ = feed.subscribe()
+
+    for i in range(3):
+        feed.broadcast(b"message")
+        fast.queue.get_nowait()
+
+    assert feed.subscribers == {fast}
+    assert slow.queue.get_nowait() is None  # told to disconnect, backlog discarded
+
+
+@pytest.mark.anyio
+async def test_feed_refreshes_after_the_projection_applies(redis_client, monkeypatch):
+    monkeypatch.setattr(live, "LEADERBOARD_FEED_DEBOUNCE_MS", 10)
+    monkeypatch.setattr(live, "LEADERBOARD_FEED_BLOCK_MS", 50)
+    feed = LeaderboardFeed()
+    subscriber, _ = feed.subscribe()
+    task = asyncio.create_task(feed.run(redis_client))
+    try:
+        await asyncio.sleep(0.1)
+        # an event the projection has not applied yet changes nothing
+        await publish_leaderboard_event("checkin", user_id=7, xp=70, version=1)
+        await asyncio.sleep(0.1)
+        assert subscriber.queue.empty()
+
+        await LeaderboardProjection(redis_client).consume_once("0-0", block=None)
+        message = await asyncio.wait_for(subscriber.queue.get(), 2)
+        assert b'{"user":"7","rank":1,"xp":70}' in message
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
@@ -0,0 +1,31 @@
+import pytest
+from app.leaderboard.reconciler import LeaderboardReconciler, RECONCILE_WATERMARK_KEY
+from app.leaderboard.services import LEADERBOARD_KEY
+from app.users.repositories import UserRepository
+from app.users.schemas import UserCreate
+
+
+@pytest.mark.anyio
+async def test_reconcile_repairs_drifted_and_missing_members(test_db_session, redis_client):
+    repo = UserRepository(test_db_session)
+    drifted = await repo.create(UserCreate(username="drifted", password="pass", xp=70))
+    missing = await repo.create(UserCreate(username="missing", password="pass", xp=40))
+    await redis_client.zadd(LEADERBOARD_KEY, {str(drifted.id): 5})
+
+    stats = await LeaderboardReconciler(repo, redis_client).reconcile()
+
+    assert stats["repaired"] >= 2
+    assert await redis_client.zscore(LEADERBOARD_KEY, str(drifted.id)) == 70
+    assert await redis_client.zscore(LEADERBOARD_KEY, str(missing.id)) == 40
+    assert await redis_client.get(RECONCILE_WATERMARK_KEY) == stats["watermark"]
+
+
+@pytest.mark.anyio
+async def test_reconcile_is_a_noop_when_in_sync(test_db_session, redis_client):
+    repo = UserRepository(test_db_session)
+    await repo.create(UserCreate(username="insync", password="pass", xp=10))
+    reconciler = LeaderboardReconciler(repo, redis_client)
+    await reconciler.reconcile()
+
+    stats = await reconciler.reconcile()
+    assert stats["repaired"] == 0
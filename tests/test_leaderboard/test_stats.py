@@ -0,0 +1,69 @@
+import asyncio
+from array import array
+from types import SimpleNamespace
+
+import pytest
+from app.leaderboard import stats
+from app.leaderboard.services import LEADERBOARD_KEY
+from app.leaderboard.stats import DistributionSnapshot, build_snapshot
+
+
+def test_percentile_and_tier_from_exact_scores():
+    snapshot = DistributionSnapshot.from_scores(array("q", range(0, 1000, 10)))
+    assert snapshot.users == 100
+    assert snapshot.percentile(0) == 0
+    assert snapshot.percentile(500) == 50
+    assert snapshot.tier(990) == "diamond"
+    assert snapshot.tier(500) == "silver"
+    assert snapshot.tier(0) == "bronze"
+
+
+def test_downsampled_snapshot_keeps_quantiles_and_round_trips():
+    snapshot = DistributionSnapshot.from_scores(array("q", range(100_000)), max_points=101)
+    assert len(snapshot.points) == 101
+    assert snapshot.users == 100_000
+    assert snapshot.score_at(50) == 49_999
+    assert abs(snapshot.percentile(90_000) - 90) < 1
+
+    restored = DistributionSnapshot.from_bytes(snapshot.to_bytes())
+    assert restored.users == snapshot.users
+    assert restored.points == snapshot.points
+
+
+@pytest.mark.anyio
+async def test_build_snapshot_pages_through_leaderboard(redis_client, monkeypatch):
+    monkeypatch.setattr(stats, "LEADERBOARD_STATS_PAGE_SIZE", 3)
+    await redis_client.zadd(LEADERBOARD_KEY, {str(i): i * 10 for i in range(10)})
+
+    snapshot = await build_snapshot(redis_client)
+
+    assert snapshot.users == 10
+    assert list(snapshot.points) == [i * 10 for i in range(10)]
+
+
+@pytest.mark.anyio
+async def test_refresher_retries_soon_until_a_snapshot_exists(monkeypatch):
+    snapshot = DistributionSnapshot.from_scores(array("q", [10]))
+    results = [None, None, snapshot]
+    sleeps = []
+
+    async def refresh(r, blob_client):
+        return results.pop(0)
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+        if not results:
+            raise asyncio.CancelledError
+
+    class BlobClient:
+        async def aclose(self):
+            pass
+
+    monkeypatch.setattr(stats, "refresh", refresh)
+    monkeypatch.setattr(stats, "asyncio", SimpleNamespace(sleep=sleep))
+    monkeypatch.setattr(stats.redis, "from_url", lambda url: BlobClient())
+    with pytest.raises(asyncio.CancelledError):
+        await stats.run_refresher(None)
+
+    retry, interval = stats.LEADERBOARD_STATS_RETRY_SECONDS, stats.LEADERBOARD_STATS_INTERVAL
+    assert sleeps == [retry, retry, interval]
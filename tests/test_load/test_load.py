@@ -0,0 +1,90 @@
+"""
+Load tests: many users through check-in, leaderboard sync and the
+leaderboard reads, asserting both the results and the number of Redis
+round trips. Run on any backend (TEST_BACKEND=local needs no services);
+scale with LOAD_TEST_USERS.
+"""
+import math
+import os
+from datetime import date
+
+import pytest
+from app.leaderboard.consumer import CONSUMER_BATCH_SIZE, LeaderboardProjection
+from app.leaderboard.services import LEADERBOARD_KEY, LeaderboardService
+from app.users import cache
+from app.users.events import LEADERBOARD_STREAM
+from app.users.models import User
+from app.users.repositories import UserRepository
+from app.users.services import UserService
+
+LOAD_TEST_USERS = int(os.getenv("LOAD_TEST_USERS", "200"))
+
+
+async def create_users(session, count: int) -> list[int]:
+    # inserted directly: hashing passwords is not what these tests measure
+    users = [User(username=f"load{i}", password="x", xp=i) for i in range(count)]
+    session.add_all(users)
+    await session.commit()
+    return [user.id for user in users]
+
+
+@pytest.mark.anyio
+async def test_checkin_load(test_db_session, redis_client, redis_round_trips):
+    service = UserService(UserRepository(test_db_session))
+    user_ids = await create_users(test_db_session, LOAD_TEST_USERS)
+    await redis_client.ping()  # connection handshake is not counted
+
+    redis_round_trips.reset()
+    for user_id in user_ids:
+        await service.checkin(user_id)
+    # bitmap check, bitmap write (pipelined with its TTL), stream event
+    assert redis_round_trips.count == 3 * LOAD_TEST_USERS
+
+    redis_round_trips.reset()
+    for user_id in user_ids:
+        with pytest.raises(Exception):
+            await service.checkin(user_id)
+    # repeats are rejected from the bitmap alone
+    assert redis_round_trips.count == LOAD_TEST_USERS
+
+    assert await cache.count_checked_in(date.today()) == LOAD_TEST_USERS
+    assert await redis_client.xlen(LEADERBOARD_STREAM) == LOAD_TEST_USERS
+    test_db_session.expire_all()
+    user = await service.find_user_by_id(user_ids[-1])
+    assert (user.xp, user.streak) == (LOAD_TEST_USERS - 1 + 10, 1)
+    await service.delete_all_users()
+
+
+@pytest.mark.anyio
+async def test_sync_redis_and_leaderboard_load(test_db_session, redis_client, redis_round_trips):
+    service = UserService(UserRepository(test_db_session))
+    await create_users(test_db_session, LOAD_TEST_USERS)
+    projection = LeaderboardProjection(redis_client)
+    await redis_client.ping()
+
+    redis_round_trips.reset()
+    assert await service.sync_all_users_to_redis() == LOAD_TEST_USERS
+    # one ZSCAN for orphaned members, one pipeline of events
+    assert redis_round_trips.count == 2
+
+    redis_round_trips.reset()
+    read, written = await projection.replay()
+    assert (read, written) == (LOAD_TEST_USERS, LOAD_TEST_USERS)
+    windows = math.ceil(LOAD_TEST_USERS / CONSUMER_BATCH_SIZE)
+    # per window: XREAD and the projection script (+ its one-off SCRIPT LOAD
+    # fallback), then the final empty XREAD
+    assert redis_round_trips.count <= 2 * windows + 3
+
+    leaderboard = LeaderboardService(redis_client)
+    redis_round_trips.reset()
+    top = await leaderboard.get_top_users(10)
+    assert [entry["xp"] for entry in top] == list(range(LOAD_TEST_USERS - 1, LOAD_TEST_USERS - 11, -1))
+    assert redis_round_trips.count == 1
+
+    redis_round_trips.reset()
+    ranked = await leaderboard.get_user_rank(top[0]["user"])
+    assert ranked["rank"] == 1
+    assert redis_round_trips.count == 2
+
+    assert await redis_client.zcard(LEADERBOARD_KEY) == LOAD_TEST_USERS
+    await service.delete_all_users()
@@ -1,5 +1,7 @@
 import pytest
-from app.users.repositories import UserRepository
+from sqlalchemy import event
+from datetime import date, timedelta
+from app.users.repositories import CheckinRepository, UserRepository
 from app.users.schemas import UserCreate, UserUpdate
 import uuid
 
@@ -84,4 +86,91 @@ async def test_delete_all_users(test_db_session):
     deleted_count = await repo.delete_all()
     assert deleted_count == users_count
     all_users = await repo.list_all()
-    assert len(all_users) == 0
\ No newline at end of file
+    assert len(all_users) == 0
+
+@pytest.mark.anyio
+async def test_update_bumps_version(test_db_session):
+    repo = UserRepository(test_db_session)
+    user_data = UserCreate(username="versioneduser", password="test", xp=30)
+    created_user = await repo.create(user_data)
+    assert created_user.version == 1
+    updated_user = await repo.update(created_user, UserUpdate(xp=40))
+    assert updated_user.version == 2
+
+
+@pytest.mark.anyio
+async def test_checkin_history_calendar_and_rollups(test_db_session):
+    repo = UserRepository(test_db_session)
+    checkins = CheckinRepository(test_db_session)
+    user = await repo.create(UserCreate(username="historyuser", password="test"))
+    day = date(2026, 1, 10)
+    await checkins.add_many([
+        {"user_id": user.id, "day": day, "xp": 10, "streak": 1},
+        {"user_id": user.id, "day": day + timedelta(days=1), "xp": 20, "streak": 2},
+    ])
+    # replaying the same day overwrites instead of failing
+    await checkins.add(user.id, day + timedelta(days=1), 20, 2)
+    await test_db_session.commit()
+
+    calendar = await checkins.calendar(user.id, day, day + timedelta(days=5))
+    assert [(c.day, c.streak) for c in calendar] == [(day, 1), (day + timedelta(days=1), 2)]
+
+    assert await checkins.refresh_rollups(day, day + timedelta(days=1)) == 2
+    counts = await checkins.daily_counts(day - timedelta(days=1), day + timedelta(days=1))
+    assert counts == [(day - timedelta(days=1), 0), (day, 1), (day + timedelta(days=1), 1)]
+
+
+@pytest.mark.anyio
+async def test_rollups_never_freeze_today(test_db_session):
+    repo = UserRepository(test_db_session)
+    checkins = CheckinRepository(test_db_session)
+    today = date.today()
+    first = await repo.create(UserCreate(username="todayfirst", password="test"))
+    second = await repo.create(UserCreate(username="todaysecond", password="test"))
+
+    await checkins.add(first.id, today, 10, 1)
+    await test_db_session.commit()
+    # only yesterday is rolled up; today stays open
+    assert await checkins.refresh_rollups(today - timedelta(days=1), today) == 1
+    await checkins.add(second.id, today, 10, 1)
+    await test_db_session.commit()
+
+    assert await checkins.daily_counts(today, today) == [(today, 2)]
+
+@pytest.mark.anyio
+async def test_delete_in_chunks_yields_bounded_chunks(test_db_session):
+    repo = UserRepository(test_db_session)
+    await repo.delete_all()
+    for i in range(5):
+        await repo.create(UserCreate(username=f"chunkdel{i}", password="pass"))
+    chunks = [rows async for rows in repo.delete_in_chunks(chunk_size=2)]
+    assert [len(rows) for rows in chunks] == [2, 2, 1]
+    assert all(row.version == 1 for rows in chunks for row in rows)
+    assert await repo.list_all() == []
+
+
+@pytest.mark.anyio
+async def test_bulk_update_is_one_versioned_statement(test_engine, test_db_session):
+    repo = UserRepository(test_db_session)
+    users = [await repo.create(UserCreate(username=f"bulk_{uuid.uuid4().hex[:6]}", password="pass")) for _ in range(3)]
+    rows = [
+        {"id": user.id, "xp": 100 + i, "last_checkin": date.today(), "last_streak_reset": None, "version": user.version}
+        for i, user in enumerate(users)
+    ]
+    rows[2]["version"] += 1  # read before someone else's write
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(test_engine.sync_engine, "before_cursor_execute", listener)
+    try:
+        updated = await repo.bulk_update(rows)
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", listener)
+    await test_db_session.commit()
+
+    ids = [user.id for user in users]
+    assert updated == {ids[0], ids[1]}
+    assert [s.split()[0] for s in statements if "UPDATE" in s] == ["WITH"]
+    test_db_session.expire_all()
+    refreshed = await repo.get_by_id(ids[0])
+    assert (refreshed.xp, refreshed.last_checkin) == (100, date.today())
@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from httpx import AsyncClient
 import uuid
@@ -25,3 +26,15 @@ async def test_create_user(async_client: AsyncClient):
     data = response.json()
     assert data.get("username") == user_data["username"]
     assert data.get("xp") == user_data["xp"]
+
+
+@pytest.mark.anyio
+async def test_concurrent_get_user_shares_one_lookup(async_client: AsyncClient):
+    response = await async_client.post("/users/", json={"username": f"shared_{uuid.uuid4().hex[:6]}", "password": "pass"})
+    user_id = response.json()["id"]
+
+    responses = await asyncio.gather(*(async_client.get(f"/users/{user_id}") for _ in range(5)))
+
+    assert {r.status_code for r in responses} == {200}
+    assert all(r.json() == responses[0].json() for r in responses)
+    assert (await async_client.get("/users/999999")).status_code == 404
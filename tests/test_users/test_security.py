@@ -0,0 +1,32 @@
+import pytest
+
+from app.users.security import PasswordHasher
+
+
+@pytest.mark.anyio
+async def test_hash_and_verify_round_trip():
+    hasher = PasswordHasher(n=2 ** 10, workers=1)
+    try:
+        encoded = await hasher.hash("secret")
+        assert encoded.startswith("scrypt$1024$8$1$")
+        assert encoded != await hasher.hash("secret")  # salted
+        assert await hasher.verify("secret", encoded)
+        assert not await hasher.verify("wrong", encoded)
+    finally:
+        hasher.shutdown()
+
+
+@pytest.mark.anyio
+async def test_needs_rehash_flags_plaintext_and_old_parameters():
+    old = PasswordHasher(n=2 ** 10, workers=1)
+    new = PasswordHasher(n=2 ** 11, workers=1)
+    try:
+        encoded = await old.hash("secret")
+        assert not old.needs_rehash(encoded)
+        assert new.needs_rehash(encoded)
+        assert new.needs_rehash("plaintext")
+        assert await new.verify("secret", encoded)
+        assert await new.verify("plaintext", "plaintext")
+    finally:
+        old.shutdown()
+        new.shutdown()
@@ -1,7 +1,18 @@
+import asyncio
 import pytest
-from app.users.repositories import UserRepository
+from datetime import date, timedelta
+from fastapi import HTTPException
+from sqlalchemy import update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from app.leaderboard.consumer import LeaderboardProjection
+from app.users import services
+from app.users import cache, events, maintenance
+from app.users.models import CheckinDailyStat, User
+from app.users.repositories import CheckinRepository, UserRepository
 from app.users.services import UserService
-from app.users.schemas import UserCreate, UserUpdate
+from app.users.schemas import BulkCheckinItem, UserCreate, UserUpdate
 
 
 @pytest.mark.anyio
@@ -94,4 +105,269 @@ async def test_delete_all_users(test_db_session):
     deleted_count = await service.delete_all_users()
     # Verify all users are deleted
     all_users = await repo.list_all()
-    assert len(all_users) == 0
\ No newline at end of file
+    assert len(all_users) == 0
+
+@pytest.mark.anyio
+async def test_checkin_marks_bitmap_and_rejects_repeat(test_db_session, redis_client, monkeypatch):
+    monkeypatch.setattr(cache, "get_redis", lambda: redis_client)
+    repo = UserRepository(test_db_session)
+    service = UserService(repo)
+    user = await service.register_user(UserCreate(username="checkinuser", password="pass"))
+
+    checked_in = await service.checkin(user.id)
+    assert checked_in.streak == 1
+    assert checked_in.xp == 10
+    assert await cache.has_checked_in(user.id, date.today())
+    assert await service.count_active_users(date.today()) == 1
+    history = await service.checkin_calendar(user.id, date.today(), date.today())
+    assert [(c.xp, c.streak) for c in history] == [(10, 1)]
+
+    with pytest.raises(HTTPException) as exc_info:
+        await service.checkin(user.id)
+    assert exc_info.value.detail == "Already checked in today"
+
+
+
+@pytest.mark.anyio
+async def test_bulk_checkin_applies_dated_sequence(test_db_session, redis_client, monkeypatch):
+    monkeypatch.setattr(cache, "get_redis", lambda: redis_client)
+    repo = UserRepository(test_db_session)
+    service = UserService(repo)
+    user = await service.register_user(UserCreate(username="bulkuser", password="pass"))
+    version = user.version
+    today = date.today()
+
+    results = await service.bulk_checkin([
+        BulkCheckinItem(user_id=user.id),
+        BulkCheckinItem(user_id=user.id, day=today - timedelta(days=2)),
+        BulkCheckinItem(user_id=user.id, day=today - timedelta(days=1)),
+        BulkCheckinItem(user_id=user.id, day=today),
+        BulkCheckinItem(user_id=user.id, day=today + timedelta(days=1)),
+        BulkCheckinItem(user_id=user.id, day=today - timedelta(days=services.BULK_CHECKIN_MAX_BACKDATE_DAYS + 1)),
+        BulkCheckinItem(user_id=999999),
+    ])
+
+    assert [r.status for r in results] == [
+        "checked_in", "checked_in", "checked_in", "already_checked_in", "invalid_date", "too_old", "not_found",
+    ]
+    assert [r.streak for r in results[:3]] == [3, 1, 2]
+
+    user_id = user.id
+    test_db_session.expire_all()
+    refreshed = await service.find_user_by_id(user_id)
+    assert refreshed.streak == 3
+    assert refreshed.xp == 30
+    assert refreshed.last_checkin == today
+    assert refreshed.version == version + 1
+    assert await cache.has_checked_in(user_id, today)
+    history = await service.checkin_calendar(user_id, today - timedelta(days=7), today)
+    assert len(history) == 3
+
+
+@pytest.mark.anyio
+async def test_find_user_by_username_is_case_insensitive_and_cached(test_db_session, redis_client, monkeypatch):
+    monkeypatch.setattr(cache, "get_redis", lambda: redis_client)
+    repo = UserRepository(test_db_session)
+    service = UserService(repo)
+    created_user = await service.register_user(UserCreate(username="CaseUser", password="pass"))
+
+    assert await cache.get_cached_user_id("CaseUser") == created_user.id
+    fetched_user = await service.find_user_by_username("CASEUSER")
+    assert fetched_user.id == created_user.id
+
+    await service.delete_user(created_user)
+    assert await cache.get_cached_user_id("CaseUser") is None
+    assert await service.find_user_by_username("caseuser") is None
+
+
+@pytest.mark.anyio
+async def test_find_user_by_username_prefers_exact_case(test_db_session, redis_client):
+    service = UserService(UserRepository(test_db_session))
+    upper = await service.register_user(UserCreate(username="Probe", password="pass"))
+    lower = await service.register_user(UserCreate(username="probe", password="pass"))
+
+    for _ in range(2):  # cold, then from the cache
+        assert (await service.find_user_by_username("Probe")).id == upper.id
+        assert (await service.find_user_by_username("probe")).id == lower.id
+
+
+@pytest.mark.anyio
+async def test_delete_all_users_tombstones_leaderboard_members(test_db_session, redis_client, monkeypatch):
+    monkeypatch.setattr(events, "get_redis", lambda: redis_client)
+    monkeypatch.setattr(cache, "get_redis", lambda: redis_client)
+    repo = UserRepository(test_db_session)
+    service = UserService(repo)
+    projection = LeaderboardProjection(redis_client, checkpoint=False)
+    user = await service.register_user(UserCreate(username="leaderboarduser", password="pass", xp=10))
+    await redis_client.zadd(events.LEADERBOARD_KEY, {"orphan": 5})
+    await projection.replay()
+
+    await service.delete_all_users()
+    await projection.replay()
+    assert await redis_client.zrange(events.LEADERBOARD_KEY, 0, -1) == ["orphan"]
+
+    # the tombstone outranks the user's older events, so a replay keeps it out
+    await projection.replay("0-0")
+    assert await redis_client.zrange(events.LEADERBOARD_KEY, 0, -1) == ["orphan"]
+    assert await redis_client.hget(events.LEADERBOARD_VERSIONS_KEY, str(user.id)) == "2"
+
+    with pytest.raises(HTTPException) as exc_info:
+        await service.delete_all_users(truncate=True)
+    assert exc_info.value.status_code == 403
+
+
+@pytest.mark.anyio
+async def test_sync_tombstones_orphans_and_keeps_versions(test_db_session, redis_client):
+    service = UserService(UserRepository(test_db_session))
+    projection = LeaderboardProjection(redis_client, checkpoint=False)
+    await service.delete_all_users()
+    user = await service.register_user(UserCreate(username="syncuser", password="pass", xp=10))
+    await redis_client.zadd(events.LEADERBOARD_KEY, {"orphan": 5})
+    await redis_client.hset(events.LEADERBOARD_VERSIONS_KEY, "orphan", 3)
+
+    assert await service.sync_all_users_to_redis() == 1
+    await projection.replay("0-0")
+
+    assert await redis_client.zrange(events.LEADERBOARD_KEY, 0, -1, withscores=True) == [(str(user.id), 10)]
+    assert await redis_client.hget(events.LEADERBOARD_VERSIONS_KEY, "orphan") == "4"
+
+
+@pytest.mark.anyio
+async def test_authenticate_hashes_and_upgrades_legacy_passwords(test_engine, test_db_session, redis_client):
+    session_factory = sessionmaker(test_engine, expire_on_commit=False, class_=AsyncSession)
+    repo = UserRepository(test_db_session)
+    service = UserService(repo, session_factory)
+    user = await service.register_user(UserCreate(username="loginuser", password="secret"))
+    assert user.password.startswith("scrypt$")
+    assert (await service.authenticate("loginuser", "secret")).id == user.id
+
+    with pytest.raises(HTTPException) as exc_info:
+        await service.authenticate("loginuser", "wrong")
+    assert exc_info.value.status_code == 401
+
+    # a row stored before hashing existed still logs in, and is upgraded
+    user_id = user.id
+    assert await repo.set_password(user_id, "legacy", user.password)
+    test_db_session.expire_all()
+    assert (await service.authenticate("loginuser", "legacy")).id == user_id
+    await asyncio.gather(*services._background_tasks)
+    test_db_session.expire_all()
+    upgraded = await service.find_user_by_id(user_id)
+    assert upgraded.password.startswith("scrypt$")
+
+
+@pytest.mark.anyio
+async def test_rehash_does_not_overwrite_a_newer_password(test_engine, test_db_session, redis_client):
+    session_factory = sessionmaker(test_engine, expire_on_commit=False, class_=AsyncSession)
+    repo = UserRepository(test_db_session)
+    service = UserService(repo, session_factory)
+    user = await service.register_user(UserCreate(username="racelogin", password="old"))
+    verified_hash = user.password
+
+    # the password changes between login and the background rehash
+    await service.update_user(user, UserUpdate(password="new"))
+    await services.rehash_password(session_factory, user.id, "old", verified_hash)
+
+    test_db_session.expire_all()
+    assert (await service.authenticate("racelogin", "new")).id == user.id
+    with pytest.raises(HTTPException):
+        await service.authenticate("racelogin", "old")
+
+
+@pytest.mark.anyio
+async def test_authenticate_matches_the_exact_username(test_db_session, redis_client):
+    service = UserService(UserRepository(test_db_session))
+    upper = await service.register_user(UserCreate(username="Alice", password="upper"))
+    lower = await service.register_user(UserCreate(username="alice", password="lower"))
+
+    assert (await service.authenticate("Alice", "upper")).id == upper.id
+    assert (await service.authenticate("alice", "lower")).id == lower.id
+    for username, password in (("ALICE", "upper"), ("Alice", "lower")):
+        with pytest.raises(HTTPException) as exc_info:
+            await service.authenticate(username, password)
+        assert exc_info.value.status_code == 401
+
+
+@pytest.mark.anyio
+async def test_rehash_errors_are_counted_not_raised(monkeypatch):
+    def broken_session_factory():
+        raise SQLAlchemyError("database is gone")
+
+    incremented = []
+    monkeypatch.setattr(services.metrics, "incr", lambda name, *args: incremented.append(name))
+    await services.rehash_password(broken_session_factory, 1, "secret", "old-hash")
+    assert incremented == ["password.rehash_errors"]
+
+
+async def bump_version_elsewhere(engine, user_id: int, xp: int):
+    """Simulate a concurrent writer committing through its own connection."""
+    async with engine.begin() as conn:
+        await conn.execute(
+            update(User).where(User.id == user_id).values(xp=xp, version=User.version + 1)
+        )
+
+
+@pytest.mark.anyio
+async def test_add_xp_is_an_atomic_increment(test_db_session, redis_client):
+    service = UserService(UserRepository(test_db_session))
+    user = await service.register_user(UserCreate(username="xpuser", password="pass", xp=5))
+    version = user.version
+
+    await service.add_xp(user.id, 10)
+    updated = await service.add_xp(user.id, -3)
+    assert (updated.xp, updated.version) == (12, version + 2)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await service.add_xp(999999, 1)
+    assert exc_info.value.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_update_user_detects_concurrent_writes(test_engine, test_db_session, redis_client):
+    service = UserService(UserRepository(test_db_session))
+    user = await service.register_user(UserCreate(username="raceuser", password="pass"))
+    version = user.version
+    await bump_version_elsewhere(test_engine, user.id, xp=100)
+
+    # a client that read the old version gets a conflict
+    with pytest.raises(HTTPException) as exc_info:
+        await service.update_user(user, UserUpdate(frozen_days=2, expected_version=version))
+    assert exc_info.value.status_code == 409
+
+    # without expected_version the write is retried against the fresh row
+    user = await service.find_user_by_id(user.id)
+    await bump_version_elsewhere(test_engine, user.id, xp=200)
+    updated = await service.update_user(user, UserUpdate(frozen_days=2))
+    assert (updated.xp, updated.frozen_days, updated.version) == (200, 2, version + 3)
+
+
+@pytest.mark.anyio
+async def test_checkin_retries_after_concurrent_write(test_engine, test_db_session, redis_client):
+    service = UserService(UserRepository(test_db_session))
+    user = await service.register_user(UserCreate(username="retrycheckin", password="pass"))
+    await bump_version_elsewhere(test_engine, user.id, xp=50)
+
+    checked_in = await service.checkin(user.id)
+    # the concurrent XP is kept, not overwritten by the stale copy
+    assert checked_in.xp == 60
+
+
+@pytest.mark.anyio
+async def test_partition_failure_does_not_block_rollups(test_engine, test_db_session, monkeypatch):
+    async def failing_partitions(*args, **kwargs):
+        raise SQLAlchemyError("partition overlaps rows in checkins_default")
+
+    session_factory = sessionmaker(test_engine, expire_on_commit=False, class_=AsyncSession)
+    repo = UserRepository(test_db_session)
+    yesterday = date.today() - timedelta(days=1)
+    user = await repo.create(UserCreate(username="rollupuser", password="pass"))
+    await CheckinRepository(test_db_session).add(user.id, yesterday, 10, 1)
+    await test_db_session.commit()
+    monkeypatch.setattr(CheckinRepository, "ensure_partitions", failing_partitions)
+
+    result = await maintenance.run_maintenance(session_factory)
+
+    assert result["partition_error"] == "SQLAlchemyError"
+    assert result["days"] == maintenance.CHECKIN_ROLLUP_LOOKBACK_DAYS
+    rolled_up = await test_db_session.get(CheckinDailyStat, yesterday)
+    assert rolled_up is not None and rolled_up.checkins >= 1